@@ -0,0 +1,59 @@
+"""
+Benchmarks for rest-core hot paths
+
+Run a benchmark module directly, i.e. `python -m benchmarks.bench_resources`
+"""
+
+import os
+import sys
+import timeit
+
+# Bootstrap the external libs - same layout as the test suite
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_DIR = os.path.abspath(os.path.join(BENCH_DIR, '../tests'))
+
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '../external')))  # dependencies
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '../rest_core')))  # code to bench
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '../')))  # project root
+sys.path.insert(0, TEST_DIR)  # test support for rest_core_settings etc
+
+
+def bench(func, number=1, repeat=3):
+    """
+    Time a callable
+    :param func: A no argument callable to time
+    :param number: How many times to call func per run
+    :param repeat: How many runs to take the best of
+    :returns: Best seconds per call
+    """
+
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def report(title, results):
+    """
+    Print a table of benchmark results
+    :param title: A `str` heading
+    :param results: A list of (name, seconds per call) tuples
+    """
+
+    print title
+    baseline = results[0][1]
+    for name, seconds in results:
+        print '  %-40s %10.2f us  %5.2fx' % (name, seconds * 1000000, baseline / seconds)
+
+
+def activate_testbed():
+    """
+    Activate the App Engine service stubs used by the unit tests - no network is needed
+    :returns: The active Testbed; deactivate it when done
+    """
+
+    from google.appengine.ext import testbed
+
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.init_datastore_v3_stub()
+    bed.init_memcache_stub()
+    return bed
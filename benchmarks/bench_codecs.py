@@ -0,0 +1,79 @@
+"""
+Benchmarks for response encoding and request decoding codecs
+"""
+
+from benchmarks import bench, report
+from benchmarks.bench_resources import RULES, make_objs
+import codec
+import resources
+
+NUM_ENTITIES = 500
+
+
+def get_codecs():
+    """
+    Instantiate every installed codec, with and without key sorting
+    """
+
+    codecs = []
+    for name in ['json', 'simplejson', 'ujson']:
+        for sort_keys in [True, False]:
+            try:
+                c = codec.JSON_CODECS[name](sort_keys=sort_keys)
+            except ImportError:
+                continue
+            codecs.append(('%s (sort_keys=%s)' % (name, sort_keys), c))
+
+    try:
+        codecs.append(('msgpack', codec.MsgPackCodec()))
+    except ImportError:
+        pass
+    return codecs
+
+
+def get_cases():
+    """
+    :returns: A list of (name, callable, number of calls per run) tuples - see benchmarks.suite
+    """
+
+    results = resources.ResourceList(make_objs(100), RULES).to_list()
+    payload = {'status': 200, 'results': results, 'messages': [None]}
+    c = codec.get_codec()
+    body = c.encode(payload)
+
+    cases = [('codec.encode 100 entity response', lambda: c.encode(payload), 50),
+             ('codec.decode 100 entity response', lambda: c.decode(body), 50)]
+
+    try:
+        msgpack_codec = codec.MsgPackCodec()
+    except ImportError:
+        return cases
+
+    packed = msgpack_codec.encode(payload)
+    return cases + [
+        ('codec.encode 100 entity response msgpack', lambda: msgpack_codec.encode(payload), 50),
+        ('codec.decode 100 entity response msgpack', lambda: msgpack_codec.decode(packed), 50),
+    ]
+
+
+def run(verbose=True):
+    results = resources.ResourceList(make_objs(NUM_ENTITIES), RULES).to_list(verbose=verbose)
+    payload = {'status': 200, 'results': results, 'messages': [None]}
+    expected = codec.JSONCodec().decode(codec.JSONCodec().encode(payload))
+
+    encode_results = []
+    decode_results = []
+    for name, c in get_codecs():
+        body = c.encode(payload)
+        assert c.decode(body) == expected
+        encode_results.append(('%s %d bytes' % (name, len(body)),
+                               bench(lambda: c.encode(payload), number=5)))
+        decode_results.append((name, bench(lambda: c.decode(body), number=5)))
+
+    return encode_results, decode_results
+
+
+if __name__ == '__main__':
+    encode_results, decode_results = run()
+    report('encode %s entity response' % NUM_ENTITIES, encode_results)
+    report('decode %s entity response' % NUM_ENTITIES, decode_results)
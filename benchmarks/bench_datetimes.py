@@ -0,0 +1,72 @@
+"""
+Benchmarks for datetime param coercion and DatetimeField output
+"""
+
+import datetime
+
+from pytz import timezone
+
+from benchmarks import bench, report
+import params
+
+NUM_DATETIMES = 1000
+DTSTR = '1982-09-02T05:30:15Z'
+
+
+def strptime_to_datetime(dtstr):
+    """
+    The original strptime implementation of params.coerce_to_datetime for comparison
+    """
+
+    try:
+        dt = datetime.datetime.strptime(dtstr, '%Y-%m-%dT%H:%M:%SZ')
+    except ValueError:
+        dt = datetime.datetime.strptime(dtstr, '%Y-%m-%d')
+    return timezone('UTC').localize(dt)
+
+
+def strftime_from_datetimes(dts):
+    """
+    The original per value strftime output of DatetimeField.from_resource_multi for comparison
+    """
+
+    return [dt.strftime('%Y-%m-%dT%H:%M:%SZ') if dt else None for dt in dts]
+
+
+def get_cases():
+    """
+    :returns: A list of (name, callable, number of calls per run) tuples - see benchmarks.suite
+    """
+
+    start = datetime.datetime(1982, 9, 2, 5, 30, 15)
+    dts = [start + datetime.timedelta(minutes=i) for i in range(100)]
+
+    return [('params.coerce_to_datetime', lambda: params.coerce_to_datetime(DTSTR), 1000),
+            ('params.coerce_from_datetimes 100 datetimes',
+             lambda: params.coerce_from_datetimes(dts), 200)]
+
+
+def run():
+    start = datetime.datetime(1982, 9, 2, 5, 30, 15)
+    dts = [start + datetime.timedelta(minutes=i) for i in range(NUM_DATETIMES)]
+
+    assert strptime_to_datetime(DTSTR) == params.coerce_to_datetime(DTSTR)
+    assert strftime_from_datetimes(dts) == params.coerce_from_datetimes(dts)
+
+    parse_results = [
+        ('strptime + pytz timezone()', bench(lambda: strptime_to_datetime(DTSTR), number=1000)),
+        ('params.coerce_to_datetime', bench(lambda: params.coerce_to_datetime(DTSTR),
+                                            number=1000)),
+    ]
+    format_results = [
+        ('strftime per value', bench(lambda: strftime_from_datetimes(dts), number=10)),
+        ('params.coerce_from_datetimes', bench(lambda: params.coerce_from_datetimes(dts),
+                                               number=10)),
+    ]
+    return parse_results, format_results
+
+
+if __name__ == '__main__':
+    parse_results, format_results = run()
+    report('parse one datetime param', parse_results)
+    report('format %s datetimes' % NUM_DATETIMES, format_results)
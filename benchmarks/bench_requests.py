@@ -0,0 +1,93 @@
+"""
+Benchmarks for the per request paths - params, cache keys, CORS and a full dispatch round trip
+"""
+
+import json
+
+import voluptuous
+import webapp2
+
+from benchmarks import activate_testbed, bench, report
+from benchmarks.bench_resources import RULES, INPUT_RULES, INPUT_DATA, make_objs
+import handlers
+import params
+import utils
+
+PARAM_SCHEMA = {'limit': voluptuous.Coerce(int), 'offset': voluptuous.Coerce(int),
+                'category': unicode}
+INPUT_PARAMS = {u'limit': u'25', u'offset': u'50', u'category': u'music', u'verbose': u'1'}
+PAGE_SIZE = 25
+
+
+class ThingsHandler(handlers.RestHandlerBase):
+    """
+    Collection handler to dispatch requests to
+    """
+
+    objs = make_objs(PAGE_SIZE)
+
+    def get_rules(self):
+        return RULES
+
+    def get_param_schema(self):
+        return PARAM_SCHEMA
+
+    def get(self):
+        self.serve_success(self.serialize(self.objs), extra_fields={'more': True})
+
+
+class ThingHandler(handlers.RestHandlerBase):
+    """
+    Item handler to POST payloads to
+    """
+
+    def get_rules(self):
+        return INPUT_RULES
+
+    def post(self):
+        self.serve_success(self.cleaned_data)
+
+
+app = webapp2.WSGIApplication([('/things', ThingsHandler), ('/thing', ThingHandler)])
+
+
+def get_response(path, method='GET', **kwargs):
+    response = webapp2.Request.blank(path, method=method, **kwargs).get_response(app)
+    assert response.status_int == 200, response.body
+    return response
+
+
+def get_cases():
+    """
+    :returns: A list of (name, callable, number of calls per run) tuples
+    """
+
+    resource_params = params.ResourceParams(PARAM_SCHEMA)
+    body = json.dumps(INPUT_DATA)
+
+    return [
+        ('params.ResourceParams.from_dict', lambda: resource_params.from_dict(INPUT_PARAMS), 1000),
+        ('utils.create_request_key', lambda: utils.create_request_key('things', INPUT_PARAMS),
+         1000),
+        ('utils.is_origin_in_whitelist (domain)',
+         lambda: utils.is_origin_in_whitelist('http://www.example.com'), 1000),
+        ('utils.is_origin_in_whitelist (rule)',
+         lambda: utils.is_origin_in_whitelist('http://localhost:8080'), 1000),
+        ('utils.is_origin_in_whitelist (miss)',
+         lambda: utils.is_origin_in_whitelist('http://cheese.com'), 1000),
+        ('dispatch GET %s resources' % PAGE_SIZE, lambda: get_response('/things?verbose=1'), 20),
+        ('dispatch POST payload', lambda: get_response('/thing', method='POST', body=body,
+                                                       content_type='application/json'), 100),
+    ]
+
+
+def run():
+    return [(name, bench(func, number=number)) for name, func, number in get_cases()]
+
+
+if __name__ == '__main__':
+    bed = activate_testbed()
+    try:
+        report('request paths per call', run())
+    finally:
+        bed.deactivate()
@@ -0,0 +1,226 @@
+"""
+Benchmarks for Resource serialization
+"""
+
+import datetime
+import voluptuous
+from google.appengine.ext import ndb
+
+from benchmarks import bench, report
+from models import Model
+import resources
+
+NUM_ENTITIES = 1000
+
+RULES = [
+    resources.RestField('name'),
+    resources.RestField('slug'),
+    resources.RestField('title'),
+    resources.RestField('summary', verbose_only=True),
+    resources.BooleanField('is_active'),
+    resources.DatetimeField('created_date'),
+    resources.GeoField('location', verbose_only=True),
+]
+
+
+SIMPLE_RULES = [
+    resources.RestField('name'),
+    resources.RestField('slug'),
+    resources.RestField('title'),
+]
+
+NESTED_RULES = RULES + [
+    resources.ResourceField('owner', 'owner_id', SIMPLE_RULES),
+]
+
+
+def make_objs(num):
+    objs = []
+    for i in range(num):
+        objs.append({'name': 'name %s' % i,
+                     'slug': 'slug-%s' % i,
+                     'title': 'Title %s' % i,
+                     'summary': 'A summary of thing %s' % i,
+                     'is_active': bool(i % 2),
+                     'created_date': datetime.datetime(2016, 1, 1, 12, 30, i % 60),
+                     'location': [],
+                     'owner_id': 'owner-%s' % (i % 10),
+                     'owner': {'name': 'owner %s' % (i % 10), 'slug': 'owner-%s' % (i % 10),
+                               'title': 'Owner %s' % (i % 10)}})
+    return objs
+
+
+class BaselineResource(object):
+    """
+    Verbatim copy of Resource (constructor and to_dict) from before rules were compiled - the
+    reference the compiled serializer is measured against
+    """
+
+    def __init__(self, obj, fields):
+        """
+        :param obj:
+            Instance of ndb.Model, dict or None when attempting to validate a resource payload
+        """
+
+        # Step 1: Make sure entities is a list
+        if not obj:
+            obj = None
+
+        # Step 2: Do some type checking
+        if obj and not isinstance(obj, resources.VALID_RESORCE_TYPES):
+            err = 'Resource() requires a instance of %s or None. Received %s, %s.'
+            raise TypeError(err % (resources.VALID_RESORCE_TYPES, type(obj), obj))
+
+        self.resource_type = 'NonDefinedClass'
+
+        if (obj and isinstance(obj, Model)):
+            self.resource_type = obj.get_kind()
+        elif (obj and isinstance(obj, ndb.Model)):
+            self.resource_type = obj.key.kind()
+
+        if not (isinstance(fields, list)):
+            err = 'Resource requires list. Received %s, %s.'
+            raise TypeError(err % (type(list), fields))
+
+        # Step 3:  Set params as instance properties
+        self.obj = obj
+        self.fields = fields
+
+        self.errors = {}
+        self.cleaned_data = {}
+
+    def to_dict(self, verbose=False):
+        """
+        Dumps a rest Resource to a dictionary of values
+        """
+
+        result = {}
+
+        obj = self.obj
+        if not obj:
+            return result
+
+        # Keep track of if we excluded anything because of verbose, etc
+        has_excluded_props = False
+
+        for field in self.fields:
+            if not field.verbose_only or verbose:
+                result[field.key] = field.from_resource(obj, field.key)
+            else:
+                has_excluded_props = True
+
+        result['_meta'] = {'is_verbose': not has_excluded_props,
+                           'resource_type': self.resource_type}
+        return result
+
+
+INPUT_RULES = [
+    resources.RestField('name', required=True),
+    resources.SlugField('slug', required=True),
+    resources.RestField('title', validator=voluptuous.Coerce(unicode)),
+    resources.RestField('summary'),
+    resources.RestField('rank', validator=voluptuous.Coerce(int)),
+    resources.BooleanField('is_active'),
+    resources.RestField('sku', output_only=True),
+]
+
+INPUT_DATA = {'name': 'Bob', 'slug': 'bob', 'title': 'A Title', 'summary': 'A summary',
+              'rank': '5', 'is_active': 'true'}
+
+
+def uncompiled_from_dict(data, fields):
+    """
+    Reference copy of the per-payload key set building and schema compiling Resource.from_dict
+    did before rules were compiled
+    """
+
+    allowed_input_field_keys = set([f.key for f in fields if not f.output_only])
+    required_input_field_keys = set([f.key for f in fields if f.required])
+    given_field_keys = set(data.keys())
+
+    for key in given_field_keys.difference(allowed_input_field_keys):
+        raise resources.UnknownFieldError(key)
+    for key in required_input_field_keys.difference(given_field_keys):
+        raise resources.RequiredFieldError(key)
+
+    cleaned_data = {}
+    for field in fields:
+        if (not field.output_only) and field.key in data:
+            field._schema = None  # Force a schema compile per field like RestField.validate did
+            cleaned_data[field.key] = field.to_resource(data)
+    return cleaned_data
+
+
+def run_from_dict():
+    def run_uncompiled():
+        return uncompiled_from_dict(INPUT_DATA, INPUT_RULES)
+
+    def run_resource():
+        return resources.Resource(None, INPUT_RULES).from_dict(INPUT_DATA)
+
+    assert run_uncompiled() == run_resource()
+
+    return [('uncompiled validation', bench(run_uncompiled, number=1000)),
+            ('Resource(None, rules).from_dict()', bench(run_resource, number=1000))]
+
+
+def run(verbose=False):
+    objs = make_objs(NUM_ENTITIES)
+
+    def run_baseline():
+        return [BaselineResource(obj, RULES).to_dict(verbose=verbose) for obj in objs]
+
+    def run_resource():
+        return [resources.Resource(obj, RULES).to_dict(verbose=verbose) for obj in objs]
+
+    def run_serializer():
+        serializer = resources.get_serializer(RULES)
+        return [serializer.to_dict(obj, verbose=verbose) for obj in objs]
+
+    def run_resource_list():
+        return resources.ResourceList(objs, RULES).to_list(verbose=verbose)
+
+    assert run_baseline() == run_serializer() == run_resource() == run_resource_list()
+
+    results = []
+    for name, func in [('baseline Resource(obj, rules).to_dict()', run_baseline),
+                       ('Resource(obj, rules).to_dict()', run_resource),
+                       ('get_serializer(rules).to_dict(obj)', run_serializer),
+                       ('ResourceList(objs, rules).to_list()', run_resource_list)]:
+        results.append((name, bench(func, number=10) / NUM_ENTITIES))
+    return results
+
+
+def get_cases():
+    """
+    :returns: A list of (name, callable, number of calls per run) tuples - see benchmarks.suite
+    """
+
+    obj = make_objs(1)[0]
+    objs = make_objs(100)
+    payloads = [dict(INPUT_DATA, name='name %s' % i) for i in range(100)]
+
+    cases = []
+    for rules_name, rules in [('simple', SIMPLE_RULES), ('mixed', RULES), ('nested', NESTED_RULES)]:
+        cases.append(('Resource.to_dict %s rules' % rules_name,
+                      lambda rules=rules: resources.Resource(obj, rules).to_dict(), 1000))
+
+    cases += [
+        ('Resource.to_dict mixed rules verbose',
+         lambda: resources.Resource(obj, RULES).to_dict(verbose=True), 1000),
+        ('ResourceList.to_list mixed rules 100 entities',
+         lambda: resources.ResourceList(objs, RULES).to_list(), 20),
+        ('ResourceList.to_list nested rules 100 entities',
+         lambda: resources.ResourceList(objs, NESTED_RULES).to_list(), 20),
+        ('Resource.from_dict', lambda: resources.Resource(None, INPUT_RULES).from_dict(INPUT_DATA),
+         1000),
+        ('ValidationPlan.clean_many 100 payloads',
+         lambda: resources.get_validation_plan(INPUT_RULES).clean_many(payloads), 20),
+    ]
+    return cases
+
+
+if __name__ == '__main__':
+    report('to_dict per entity (verbose=False)', run(verbose=False))
+    report('to_dict per entity (verbose=True)', run(verbose=True))
+    report('from_dict per payload', run_from_dict())
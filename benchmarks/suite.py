@@ -0,0 +1,137 @@
+"""
+Run every benchmark case and save the results as JSON to compare runs
+
+    python -m benchmarks.suite --output before.json
+    ... make changes ...
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Comparing exits with status 1 if any case got slower than the threshold.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+
+from benchmarks import activate_testbed, bench
+
+SUITE_MODULES = [
+    'benchmarks.bench_resources',
+    'benchmarks.bench_codecs',
+    'benchmarks.bench_datetimes',
+    'benchmarks.bench_requests',
+]
+
+DEFAULT_THRESHOLD = 0.2  # Fraction slower than the baseline to call a regression
+
+
+def get_cases(module_names=SUITE_MODULES):
+    """
+    Collect the cases of every benchmark module
+    :returns: A list of (name, callable, number of calls per run) tuples
+    """
+
+    cases = []
+    for module_name in module_names:
+        __import__(module_name)
+        cases += sys.modules[module_name].get_cases()
+    return cases
+
+
+def run_suite(cases, repeat=3, name_filter=None):
+    """
+    Time every case
+    :param name_filter: Only run cases whose name contains this `str`
+    :returns: A dict of case name to best seconds per call
+    """
+
+    results = {}
+    for name, func, number in cases:
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = bench(func, number=number, repeat=repeat)
+    return results
+
+
+def save_results(path, results):
+    data = {
+        'created': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results to a baseline run
+    :returns: A list of (name, baseline seconds, seconds, ratio, is_regression) tuples for the
+        cases in both runs. A ratio above 1 is slower than the baseline.
+    """
+
+    comparison = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+
+        ratio = results[name] / baseline[name]
+        comparison.append((name, baseline[name], results[name], ratio, ratio > 1 + threshold))
+    return comparison
+
+
+def report(results, comparison=None):
+    """
+    Print the results, with the change from the baseline if compared
+    """
+
+    if not comparison:
+        for name in sorted(results):
+            print '  %-48s %12.2f us' % (name, results[name] * 1000000)
+        return
+
+    for name, baseline_seconds, seconds, ratio, is_regression in comparison:
+        print '  %-48s %12.2f us %12.2f us  %5.2fx%s' % (
+            name, baseline_seconds * 1000000, seconds * 1000000, ratio,
+            '  REGRESSION' if is_regression else '')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the rest_core benchmark suite')
+    parser.add_argument('--output', help='Path to save the results JSON to')
+    parser.add_argument('--compare', help='Path to a results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Fraction slower than the baseline to fail on (default 0.2)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs to take the best of')
+    parser.add_argument('--filter', help='Only run cases whose name contains this')
+    args = parser.parse_args(argv)
+
+    bed = activate_testbed()
+    try:
+        results = run_suite(get_cases(), repeat=args.repeat, name_filter=args.filter)
+    finally:
+        bed.deactivate()
+
+    if args.output:
+        save_results(args.output, results)
+
+    comparison = None
+    if args.compare:
+        comparison = compare(load_results(args.compare), results, threshold=args.threshold)
+
+    report(results, comparison)
+
+    if comparison and any(is_regression for _, _, _, _, is_regression in comparison):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
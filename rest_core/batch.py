@@ -0,0 +1,196 @@
+"""
+Batch endpoint to dispatch many sub requests to the same app in one HTTP call
+"""
+
+import logging
+import threading
+import urllib
+
+import webapp2
+import webob
+
+from constants import API_BATCH_MAX_REQUESTS, API_BATCH_MAX_CONCURRENCY
+from codec import get_codec
+from handlers import RestHandlerBase
+import exc as rest_exceptions
+
+SUB_REQUEST_KEYS = set(['method', 'path', 'params', 'body'])
+SUB_REQUEST_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+CONCURRENT_METHODS = ('GET',)  # Reads that can run alongside each other
+
+# Parent request headers not passed on to sub requests - sub responses are always JSON envelopes
+EXCLUDED_HEADERS = set(['content-length', 'content-type', 'accept', 'accept-encoding',
+                        'if-none-match'])
+
+
+class BatchHandler(RestHandlerBase):
+    """
+    Dispatch a JSON list of sub requests through the app's routes in one HTTP call
+
+    POST a list of {"method": "GET", "path": "/posts", "params": {...}, "body": {...}} and get
+    back a list of {"status": ..., "results": ..., "messages": ...} envelopes in the same order.
+    Each sub request runs through the normal handler dispatch (middleware, validation, errors).
+    Consecutive GETs are run concurrently, up to REST_BATCH_MAX_CONCURRENCY at a time.
+    Writes run one at a time in order.
+
+    Route it like: ('/batch', BatchHandler)
+    """
+
+    def validate_payload(self):
+        """
+        Validate the list of sub requests
+        """
+
+        sub_requests = self.data
+        if not isinstance(sub_requests, list):
+            raise rest_exceptions.BadRequestException('Batch payload must be a list.')
+
+        if len(sub_requests) > API_BATCH_MAX_REQUESTS:
+            err = 'Batch payload has %s requests. The limit is %s.'
+            raise rest_exceptions.BadRequestException(err % (len(sub_requests),
+                                                             API_BATCH_MAX_REQUESTS))
+
+        self.cleaned_data = []
+        for i, sub_request in enumerate(sub_requests):
+            if not isinstance(sub_request, dict):
+                err = 'Batch request %s must be an object.'
+                raise rest_exceptions.BadRequestException(err % i)
+
+            unknown_keys = set(sub_request.keys()).difference(SUB_REQUEST_KEYS)
+            if unknown_keys:
+                err = 'Batch request %s has unknown keys %s.'
+                raise rest_exceptions.BadRequestException(err % (i, sorted(unknown_keys)))
+
+            method = (sub_request.get('method') or 'GET').upper()
+            if method not in SUB_REQUEST_METHODS:
+                err = 'Batch request %s has unsupported method %s.'
+                raise rest_exceptions.BadRequestException(err % (i, method))
+
+            path = sub_request.get('path')
+            if not (isinstance(path, basestring) and path.startswith('/')):
+                err = 'Batch request %s requires a path starting with /.'
+                raise rest_exceptions.BadRequestException(err % i)
+
+            if path.split('?')[0] == self.request.path:
+                err = 'Batch request %s cannot be a batch request.'
+                raise rest_exceptions.BadRequestException(err % i)
+
+            params = sub_request.get('params') or {}
+            if not isinstance(params, dict):
+                err = 'Batch request %s params must be an object.'
+                raise rest_exceptions.BadRequestException(err % i)
+
+            self.cleaned_data.append({'method': method,
+                                      'path': path,
+                                      'params': params,
+                                      'body': sub_request.get('body')})
+
+    def post(self):
+        self.serve_success(self.run_requests(self.cleaned_data))
+
+    def run_requests(self, sub_requests):
+        """
+        Run sub requests, consecutive reads concurrently
+        :returns: A list of response envelopes in order of sub_requests
+        """
+
+        results = [None] * len(sub_requests)
+
+        group = []
+        for i, sub_request in enumerate(sub_requests):
+            if sub_request['method'] in CONCURRENT_METHODS:
+                group.append(i)
+                continue
+
+            self.run_concurrently(sub_requests, group, results)
+            group = []
+
+            results[i] = self.run_request(sub_request)
+
+        self.run_concurrently(sub_requests, group, results)
+        return results
+
+    def run_concurrently(self, sub_requests, indexes, results):
+        """
+        Run the sub requests at indexes in threads, storing their envelopes in results
+        """
+
+        if len(indexes) < 2 or API_BATCH_MAX_CONCURRENCY < 2:
+            for i in indexes:
+                results[i] = self.run_request(sub_requests[i])
+            return
+
+        app = self.request.app  # self.app is a thread local proxy
+
+        def run(i):
+            app.set_globals(app=app, request=self.request)
+            try:
+                results[i] = self.run_request(sub_requests[i])
+            finally:
+                app.clear_globals()
+
+        for start in range(0, len(indexes), API_BATCH_MAX_CONCURRENCY):
+            threads = [threading.Thread(target=run, args=(i,))
+                       for i in indexes[start:start + API_BATCH_MAX_CONCURRENCY]]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+    def build_request(self, sub_request):
+        """
+        Build a webapp2.Request for a sub request, passing on the parent request's headers
+        """
+
+        params = []
+        for key, value in sub_request['params'].items():
+            values = value if isinstance(value, list) else [value]
+            for v in values:
+                if isinstance(v, unicode):
+                    v = v.encode('utf-8')
+                params.append((key.encode('utf-8'), v))
+
+        url = sub_request['path']
+        if params:
+            url = '%s%s%s' % (url, '&' if '?' in url else '?', urllib.urlencode(params))
+
+        headers = dict((k, v) for k, v in self.request.headers.items()
+                       if k.lower() not in EXCLUDED_HEADERS)
+
+        request = webapp2.Request.blank(url, base_url=self.request.host_url, headers=headers)
+        request.method = sub_request['method']
+        request.app = self.request.app
+
+        if sub_request['body'] is not None:
+            request.body = get_codec().encode(sub_request['body'])
+            request.content_type = 'application/json'
+
+        return request
+
+    def run_request(self, sub_request):
+        """
+        Dispatch a single sub request through the router
+        :returns: A response envelope dict
+        """
+
+        try:
+            request = self.build_request(sub_request)
+            response = webapp2.Response()
+            request.app.router.dispatch(request, response)
+        except webob.exc.HTTPException, e:
+            return {'status': e.code, 'results': [], 'messages': [unicode(e.explanation)]}
+        except Exception, e:
+            logging.exception(e)
+            return {'status': 500, 'results': [], 'messages': [unicode(e)]}
+
+        try:
+            envelope = get_codec().decode(response.body)
+        except ValueError:
+            envelope = None
+
+        if not isinstance(envelope, dict):
+            return {'status': response.status_int, 'results': [],
+                    'messages': ['Response was not a rest envelope.']}
+
+        envelope['status'] = response.status_int
+        return envelope
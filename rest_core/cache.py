@@ -0,0 +1,136 @@
+"""
+Cache backends for the response cache
+
+Configure with REST_CACHE_BACKEND in rest_core_settings - one of 'memcache' (default), 'local'
+(in-process LRU) or a dotted path to a backend class.
+"""
+
+import logging
+import threading
+import time
+
+from google.appengine.api import memcache
+
+from constants import API_CACHE_BACKEND, API_CACHE_LOCAL_SIZE
+import utils as rest_utils
+
+
+class LocalCacheBackend(object):
+    """
+    In-process LRU cache with per key expiry. Entries are not shared between instances.
+    """
+
+    def __init__(self, max_size=1000):
+        self.cache = rest_utils.LRUCache(max_size=max_size)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+
+        expires, value = entry
+        if expires and expires < time.time():
+            self.cache.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=0):
+        """
+        :param ttl: Seconds until the entry expires; 0 for no expiry
+        """
+
+        expires = None
+        if ttl:
+            expires = time.time() + ttl
+        self.cache.set(key, (expires, value))
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def incr(self, key):
+        """
+        Increment a counter, starting it at 1 if it does not exist
+        """
+
+        with self.lock:
+            value = (self.get(key) or 0) + 1
+            self.set(key, value)
+        return value
+
+
+class MemcacheBackend(object):
+    """
+    App Engine memcache - shared between instances
+    """
+
+    def __init__(self, namespace='rest_core'):
+        self.namespace = namespace
+
+    def get(self, key):
+        return memcache.get(key, namespace=self.namespace)
+
+    def set(self, key, value, ttl=0):
+        memcache.set(key, value, time=ttl, namespace=self.namespace)
+
+    def delete(self, key):
+        memcache.delete(key, namespace=self.namespace)
+
+    def incr(self, key):
+        return memcache.incr(key, initial_value=0, namespace=self.namespace)
+
+
+_backend = None
+
+
+def get_cache_backend():
+    """
+    Get the configured cache backend, building it on first use
+    """
+
+    global _backend
+
+    if _backend is None:
+        if API_CACHE_BACKEND == 'local':
+            _backend = LocalCacheBackend(max_size=API_CACHE_LOCAL_SIZE)
+        elif API_CACHE_BACKEND == 'memcache':
+            _backend = MemcacheBackend()
+        else:
+            _backend = rest_utils.path_to_reference(API_CACHE_BACKEND)()
+    return _backend
+
+
+def safe_set(key, value, ttl=0):
+    """
+    Store a value in the configured backend, logging rather than raising if it cannot be stored
+    (i.e. memcache refuses values over 1MB) - cache writes are best effort and must never fail
+    the request making them
+    :returns: True if the value was stored
+    """
+
+    try:
+        get_cache_backend().set(key, value, ttl=ttl)
+    except Exception, e:
+        logging.warning('Failed to cache %s: %s', key, e)
+        return False
+    return True
+
+
+def get_generation(kind):
+    """
+    Get the current cache generation for a resource kind - bumped on every invalidation
+    """
+
+    return get_cache_backend().get(_generation_key(kind)) or 0
+
+
+def invalidate(kind):
+    """
+    Invalidate every cached response for a resource kind
+    """
+
+    return get_cache_backend().incr(_generation_key(kind))
+
+
+def _generation_key(kind):
+    return 'generation_%s' % kind
@@ -0,0 +1,249 @@
+"""
+Pluggable codecs for encoding responses and decoding request bodies
+
+Configure with REST_JSON_CODEC in rest_core_settings - one of 'json' (default), 'simplejson',
+'ujson', 'auto' (fastest available) or a dotted path to a codec class.
+Codecs whose module is not installed fall back to the stdlib json codec.
+
+Binary codecs (see BINARY_CODECS) are negotiated per request from the Accept and Content-Type
+headers when enabled with REST_MSGPACK_ENABLED.
+"""
+
+import datetime
+import json
+import logging
+import struct
+
+import pytz
+from google.appengine.ext import ndb
+
+from constants import API_JSON_CODEC, API_JSON_SORT_KEYS, API_MSGPACK_ENABLED
+import utils as rest_utils
+
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
+# msgpack extension type codes for values encoded natively
+EXT_DATETIME = 1  # Signed big endian int64 of microseconds since the epoch, UTC
+EXT_GEO_PT = 2  # Big endian float64 lat then lon
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class JSONCodec(object):
+    """
+    Codec using the stdlib json module
+    """
+
+    name = 'json'
+    content_type = 'application/json'
+    native_types = False  # Encodes datetimes and GeoPts itself - see ResourceSerializer
+    streamable = True  # Responses can be written as chunks of encoded text - see stream_payload
+
+    def __init__(self, sort_keys=True):
+        """
+        :param sort_keys: Sort object keys for deterministic output
+        """
+
+        self.sort_keys = sort_keys
+        self.module = self.load_module()
+
+    def load_module(self):
+        """
+        Import the underlying library. Raises ImportError if it is not installed.
+        """
+
+        return json
+
+    def encode(self, payload, pretty=False):
+        """
+        Encode a native payload to a str
+        """
+
+        if pretty:
+            return self.module.dumps(payload, sort_keys=self.sort_keys, indent=4,
+                                     separators=(',', ': '))
+        return self.module.dumps(payload, sort_keys=self.sort_keys)
+
+    def decode(self, body):
+        """
+        Decode a request body str to native types
+        """
+
+        return self.module.loads(body)
+
+
+class SimpleJSONCodec(JSONCodec):
+    """
+    Codec using simplejson and its C speedups
+    """
+
+    name = 'simplejson'
+
+    def load_module(self):
+        import simplejson
+        return simplejson
+
+
+class UJSONCodec(JSONCodec):
+    """
+    Codec using ujson
+    """
+
+    name = 'ujson'
+
+    def load_module(self):
+        import ujson
+        return ujson
+
+    def encode(self, payload, pretty=False):
+        indent = 4 if pretty else 0
+        return self.module.dumps(payload, sort_keys=self.sort_keys, indent=indent,
+                                 escape_forward_slashes=False)
+
+
+JSON_CODECS = {
+    'json': JSONCodec,
+    'simplejson': SimpleJSONCodec,
+    'ujson': UJSONCodec,
+}
+
+AUTO_CODEC_ORDER = ['ujson', 'simplejson', 'json']  # Fastest first
+
+
+class MsgPackCodec(JSONCodec):
+    """
+    Binary codec using msgpack - smaller and faster to encode and parse than JSON
+
+    Datetimes and GeoPts are encoded natively as the extension types EXT_DATETIME and EXT_GEO_PT
+    rather than formatted as strings, and decoded back to UTC datetimes and GeoPts.
+    """
+
+    name = 'msgpack'
+    content_type = MSGPACK_CONTENT_TYPE
+    native_types = True
+    streamable = False
+
+    def load_module(self):
+        import msgpack
+        return msgpack
+
+    def encode(self, payload, pretty=False):
+        """
+        Encode a native payload to a msgpack str - pretty does not apply
+        """
+
+        # unicode and str both pack as msgpack strings so clients get text, not bytes
+        return self.module.packb(payload, use_bin_type=False, default=self.encode_ext)
+
+    def decode(self, body):
+        return self.module.unpackb(body, raw=False, ext_hook=self.decode_ext)
+
+    def encode_ext(self, obj):
+        """
+        packb default hook - pack datetimes and GeoPts as extension types
+        """
+
+        if isinstance(obj, datetime.datetime):
+            if obj.tzinfo is not None:
+                obj = obj.astimezone(pytz.utc).replace(tzinfo=None)
+
+            delta = obj - EPOCH
+            microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+            return self.module.ExtType(EXT_DATETIME, struct.pack('>q', microseconds))
+
+        if isinstance(obj, ndb.GeoPt):
+            return self.module.ExtType(EXT_GEO_PT, struct.pack('>dd', obj.lat, obj.lon))
+
+        raise TypeError('%r is not msgpack serializable' % (obj,))
+
+    def decode_ext(self, code, data):
+        """
+        unpackb ext_hook - unpack the extension types of encode_ext
+        """
+
+        if code == EXT_DATETIME:
+            microseconds = struct.unpack('>q', data)[0]
+            return (EPOCH + datetime.timedelta(microseconds=microseconds)).replace(tzinfo=pytz.utc)
+
+        if code == EXT_GEO_PT:
+            lat, lon = struct.unpack('>dd', data)
+            return ndb.GeoPt(lat=lat, lon=lon)
+
+        return self.module.ExtType(code, data)
+
+
+BINARY_CODECS = {
+    MSGPACK_CONTENT_TYPE: MsgPackCodec,
+}
+
+_codec = None
+
+
+def get_codec():
+    """
+    Get the configured codec, resolving it on first use
+    """
+
+    global _codec
+
+    if _codec is None:
+        _codec = load_codec(API_JSON_CODEC, sort_keys=API_JSON_SORT_KEYS)
+    return _codec
+
+
+def load_codec(codec_name, sort_keys=True):
+    """
+    Instantiate a codec by name or dotted path, falling back to stdlib json if unavailable
+    """
+
+    if not codec_name:
+        codec_name = 'json'
+
+    if codec_name == 'auto':
+        for name in AUTO_CODEC_ORDER:
+            try:
+                return JSON_CODECS[name](sort_keys=sort_keys)
+            except ImportError:
+                pass
+
+    if codec_name in JSON_CODECS:
+        codec_class = JSON_CODECS[codec_name]
+    else:
+        codec_class = rest_utils.path_to_reference(codec_name)
+
+    try:
+        return codec_class(sort_keys=sort_keys)
+    except ImportError, e:
+        logging.warning('Codec %s is not available, using json. Error: %s' % (codec_name, e))
+        return JSONCodec(sort_keys=sort_keys)
+
+
+_binary_codecs = {}
+
+
+def get_binary_codec(content_type):
+    """
+    Get the binary codec for a media type, i.e. from an Accept or Content-Type header
+    :returns: A codec or None if the type is not a binary codec, binary codecs are not enabled
+        or the codec's module is not installed
+    """
+
+    if not API_MSGPACK_ENABLED or content_type not in BINARY_CODECS:
+        return None
+
+    if content_type not in _binary_codecs:
+        try:
+            _binary_codecs[content_type] = BINARY_CODECS[content_type]()
+        except ImportError, e:
+            logging.warning('Codec for %s is not available. Error: %s' % (content_type, e))
+            _binary_codecs[content_type] = None
+    return _binary_codecs[content_type]
+
+
+def get_binary_content_types():
+    """
+    Get the media types of the available binary codecs - offered in content negotiation
+    """
+
+    return [content_type for content_type in sorted(BINARY_CODECS)
+            if get_binary_codec(content_type) is not None]
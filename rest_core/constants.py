@@ -5,3 +5,23 @@ import rest_core_settings as settings
 API_DEFAULT_ORIGIN = settings.REST_DEFAULT_ORIGIN
 API_WHITELIST_DOMAINS = settings.REST_WHITELIST_DOMAINS
 API_WHITELIST_RULES = settings.REST_WHITELIST_RULES
+API_CORS_CACHE_SIZE = getattr(settings, 'REST_CORS_CACHE_SIZE', 1000)
+API_CORS_MAX_AGE = getattr(settings, 'REST_CORS_MAX_AGE', 600)  # Seconds; None to disable
+API_JSON_CODEC = getattr(settings, 'REST_JSON_CODEC', 'json')
+API_JSON_SORT_KEYS = getattr(settings, 'REST_JSON_SORT_KEYS', True)
+API_MSGPACK_ENABLED = getattr(settings, 'REST_MSGPACK_ENABLED', False)  # Needs msgpack installed
+API_CACHE_BACKEND = getattr(settings, 'REST_CACHE_BACKEND', 'memcache')
+API_CACHE_LOCAL_SIZE = getattr(settings, 'REST_CACHE_LOCAL_SIZE', 1000)
+API_COMPRESSION_ENABLED = getattr(settings, 'REST_COMPRESSION_ENABLED', False)
+API_COMPRESSION_MIN_SIZE = getattr(settings, 'REST_COMPRESSION_MIN_SIZE', 1024)  # Bytes
+API_COMPRESSION_LEVEL = getattr(settings, 'REST_COMPRESSION_LEVEL', 6)  # 1 (fast) to 9 (small)
+API_BATCH_MAX_REQUESTS = getattr(settings, 'REST_BATCH_MAX_REQUESTS', 20)
+API_BATCH_MAX_CONCURRENCY = getattr(settings, 'REST_BATCH_MAX_CONCURRENCY', 5)
+API_PAGE_DEFAULT_LIMIT = getattr(settings, 'REST_PAGE_DEFAULT_LIMIT', 25)
+API_PAGE_MAX_LIMIT = getattr(settings, 'REST_PAGE_MAX_LIMIT', 100)
+API_PAGE_PREFETCH_TTL = getattr(settings, 'REST_PAGE_PREFETCH_TTL', 30)  # Seconds
+API_EXPORT_BATCH_SIZE = getattr(settings, 'REST_EXPORT_BATCH_SIZE', 500)
+API_EXPORT_MAX_RESULTS = getattr(settings, 'REST_EXPORT_MAX_RESULTS', 10000)  # None for no cap
+API_EXPORT_TIME_LIMIT = getattr(settings, 'REST_EXPORT_TIME_LIMIT', 30)  # Seconds; None for no cap
+API_SERVER_TIMING_ENABLED = getattr(settings, 'REST_SERVER_TIMING_ENABLED', False)
+API_STATS_SINK = getattr(settings, 'REST_STATS_SINK', None)  # Dotted path to a sink class
@@ -35,3 +35,17 @@ class BadRequestException(RestError):
     400 Bad Request Error
     """
     pass
+
+
+class PayloadValidationException(BadRequestException):
+    """
+    400 Bad Request Error for a payload with many invalid items
+    """
+
+    def __init__(self, message, errors):
+        """
+        :param errors: A list of {'index': int, 'message': str} dicts, one per invalid item
+        """
+
+        super(PayloadValidationException, self).__init__(message)
+        self.errors = errors
@@ -4,45 +4,452 @@ Rest Controller Base Handlers
 
 import webapp2
 import webob
-import json
+from google.appengine.ext import ndb
+import hashlib
+import time
 import traceback
 import sys
 import logging
 from core import exceptions as core_exceptions
-from constants import API_DEFAULT_ORIGIN
-from resources import Resource
+from constants import API_DEFAULT_ORIGIN, API_CORS_MAX_AGE
+from constants import API_COMPRESSION_ENABLED, API_COMPRESSION_MIN_SIZE, API_COMPRESSION_LEVEL
+from constants import API_SERVER_TIMING_ENABLED
+from constants import API_EXPORT_MAX_RESULTS, API_EXPORT_TIME_LIMIT
+from resources import Resource, ResourceList, iter_resources, get_projection
+from resources import ResourceRows, get_serializer, get_validation_plan, INPUT_ERRORS
 from params import ResourceParams
+from codec import get_codec, get_binary_codec, get_binary_content_types
+import cache as rest_cache
+import pagination
+import timing
 import exc as rest_exceptions
 import utils as rest_utils
 
 
+_compiled_param_schemas = {}  # Handler class to compiled ResourceParams
+
+JSON_CONTENT_TYPE = 'application/json'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'  # Newline delimited JSON - see serve_ndjson
+
+
 class RestHandlerBase(webapp2.RequestHandler):
     """
     Base Class for All Rest Endpoints
     """
 
+    # The param schema is compiled once per handler class.
+    # Set to False if get_param_schema varies per request.
+    cache_param_schema = True
+
+    # Seconds to cache successful GET responses for; None disables the response cache.
+    cache_ttl = None
+
+    # Resource kind for cache invalidation. Successful POST, PUT and DELETE requests invalidate
+    # every cached response of the same kind. Defaults to the class name when cache_ttl is set.
+    cache_kind = None
+
+    # Per-phase timing of the current request - see timing.get_timer
+    timer = timing.NULL_TIMER
+
+    # What input payloads are profiled under (see profiler). Defaults to the class name.
+    resource_type = None
+
+    # Set to True to have serve_page stream the whole query to clients that accept
+    # application/x-ndjson - see serve_ndjson. Other handlers always respond with JSON.
+    serves_ndjson = False
+
     def get_param_schema(self):
         """
         If you want query params, you must implement this
         """
         return {}
 
+    @classmethod
+    def warmup(cls):
+        """
+        Compile the param schema for this handler ahead of its first request
+        """
+
+        resource_params = ResourceParams(cls().get_param_schema())
+        resource_params.get_schema()
+        _compiled_param_schemas[cls] = resource_params
+        return resource_params
+
+    def get_resource_params(self):
+        """
+        Get the ResourceParams for this handler
+        """
+
+        if not self.cache_param_schema:
+            return ResourceParams(self.get_param_schema())
+
+        resource_params = _compiled_param_schemas.get(self.__class__)
+        if resource_params is None:
+            resource_params = ResourceParams(self.get_param_schema())
+            _compiled_param_schemas[self.__class__] = resource_params
+        return resource_params
+
     def validate_params(self):
         """
         Run Validation on query params
         """
 
-        param_schema = self.get_param_schema()
-        self.cleaned_params = ResourceParams(param_schema).from_dict(self.params)
+        self.cleaned_params = self.get_resource_params().from_dict(self.params)
 
     def validate_payload(self):  # aka Form.clean
         """
         Validate the request payload against the rest rules
-        This only works for a single payload entity, not a list...
+        If the payload is a list, each item is validated and cleaned_data is a list. Every
+        invalid item is reported in a single PayloadValidationException. An invalid single
+        payload is a BadRequestException.
         """
 
         rules = self.get_rules()
-        self.cleaned_data = Resource(None, rules).from_dict(self.data)
+
+        resource_type = self.resource_type or self.__class__.__name__
+
+        if isinstance(self.data, list):
+            self.cleaned_data, errors = get_validation_plan(rules).clean_many(
+                self.data, resource_type=resource_type)
+            if errors:
+                err = '%s of %s payload items are invalid.'
+                raise rest_exceptions.PayloadValidationException(
+                    err % (len(errors), len(self.data)), errors)
+            return
+
+        try:
+            resource = Resource(None, rules)
+            self.cleaned_data = resource.from_dict(self.data, resource_type=resource_type)
+        except INPUT_ERRORS, e:
+            raise rest_exceptions.BadRequestException(unicode(e))
+
+    def serialize(self, obj, rules=None):
+        """
+        Serialize an object, a list of objects or an iterator of objects for output
+        Respects the verbose, fields and format params of the request. Iterators are serialized
+        lazily for streaming via serve_success and always output objects.
+        :param rules: The rules list to output - defaults to get_rules()
+        """
+
+        if rules is None:
+            rules = self.get_rules()
+
+        verbose = self.cleaned_params.get('verbose', False)
+        fields = self.cleaned_params.get('fields')
+
+        # Binary codecs encode datetimes and geo points themselves
+        native = self.get_response_codec().native_types
+
+        if is_result_stream(obj):
+            return iter_resources(obj, rules, verbose=verbose, selected_fields=fields,
+                                  native=native)
+
+        with self.timer.phase('serialize'):
+            if isinstance(obj, (list, tuple)):
+                resource_list = ResourceList(obj, rules)
+                if self.cleaned_params.get('format') == 'rows':
+                    return resource_list.to_rows(verbose=verbose, fields=fields, native=native)
+                return resource_list.to_list(verbose=verbose, fields=fields, native=native)
+            return Resource(obj, rules).to_dict(verbose=verbose, fields=fields, native=native)
+
+    @ndb.tasklet
+    def serialize_async(self, obj, rules=None):
+        """
+        Tasklet version of serialize for objects and lists - the batched fetches of fields (i.e.
+        ResourceField) overlap with other tasklets of the handler, i.e.
+
+            @ndb.tasklet
+            def get(self):
+                posts, user = yield Post.query().fetch_async(20), self.get_user_async()
+                results = yield self.serialize_async(posts)
+                self.serve_success(results)
+
+        Single objects are serialized as a list of one (see to_list_async), which outputs the same
+        dict as serialize.
+        """
+
+        if rules is None:
+            rules = self.get_rules()
+
+        verbose = self.cleaned_params.get('verbose', False)
+        fields = self.cleaned_params.get('fields')
+        native = self.get_response_codec().native_types
+        serializer = get_serializer(rules)
+
+        if isinstance(obj, (list, tuple)):
+            rows = self.cleaned_params.get('format') == 'rows'
+            result = yield serializer.to_list_async(obj, verbose=verbose, fields=fields, rows=rows,
+                                                    native=native)
+        else:
+            results = yield serializer.to_list_async([obj], verbose=verbose, fields=fields,
+                                                     native=native)
+            result = results[0]
+
+        raise ndb.Return(result)
+
+    def serve_page(self, query, rules=None, prefetch=False, **query_options):
+        """
+        Serve a page of a query with the request's cursor, limit, verbose and fields params
+        Merge pagination.PARAM_SCHEMA into get_param_schema to accept cursor and limit.
+        Requests that accept application/x-ndjson get the whole query if serves_ndjson is set -
+        see serve_ndjson.
+        :param prefetch: Fetch the following page while this one is serialized - see paginate
+        :param query_options: Passed on to the query fetch, i.e. projection
+        """
+
+        if rules is None:
+            rules = self.get_rules()
+
+        if self.wants_ndjson():
+            return self.serve_ndjson(query, rules=rules, **query_options)
+
+        page = pagination.paginate(query, self.cleaned_params.get('cursor'),
+                                   self.cleaned_params.get('limit'), rules,
+                                   verbose=self.cleaned_params.get('verbose', False),
+                                   fields=self.cleaned_params.get('fields'),
+                                   rows=self.cleaned_params.get('format') == 'rows',
+                                   prefetch=prefetch,
+                                   native=self.get_response_codec().native_types,
+                                   cache_kind=self.get_cache_kind(), **query_options)
+
+        results = page.pop('results')
+        self.serve_success(results, extra_fields=page)
+        if self.serves_ndjson:
+            self.add_vary('Accept')  # Or it would have been NDJSON
+
+    def wants_ndjson(self):
+        """
+        Determine if the handler serves newline delimited JSON and the client asked for it via
+        the Accept header
+        """
+
+        if not self.serves_ndjson:
+            return False
+
+        offers = [JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE]
+        return self.request.accept.best_match(offers) == NDJSON_CONTENT_TYPE
+
+    def get_response_codec(self):
+        """
+        Negotiate the codec for the response body from the Accept header - JSON unless a binary
+        codec (i.e. msgpack with REST_MSGPACK_ENABLED) is available and preferred
+        """
+
+        if getattr(self, 'response_codec', None) is None:
+            codec = None
+
+            binary_content_types = get_binary_content_types()
+            if binary_content_types:
+                offers = [JSON_CONTENT_TYPE] + binary_content_types
+                codec = get_binary_codec(self.request.accept.best_match(offers))
+
+            self.response_codec = codec or get_codec()
+        return self.response_codec
+
+    def serve_ndjson(self, query, rules=None, batch_size=None, max_results=None, time_limit=None,
+                     **query_options):
+        """
+        Stream resources of a query as newline delimited JSON, starting at the request's cursor
+        param. Pages of batch_size entities are fetched as they are needed - see
+        pagination.iter_pages. The python27 runtime buffers the whole response and enforces a
+        request deadline and response size cap, so each request exports up to max_results
+        resources or time_limit seconds and clients resume from the trailer's next_cursor.
+        :param max_results: Stop after the page that reaches this many resources - defaults to
+            REST_EXPORT_MAX_RESULTS; 0 for no cap
+        :param time_limit: Stop after the page that ends this many seconds into the export -
+            defaults to REST_EXPORT_TIME_LIMIT; 0 for no cap
+        """
+
+        if rules is None:
+            rules = self.get_rules()
+
+        if max_results is None:
+            max_results = API_EXPORT_MAX_RESULTS
+        if time_limit is None:
+            time_limit = API_EXPORT_TIME_LIMIT
+
+        deadline = None
+        if time_limit:
+            deadline = time.time() + time_limit
+
+        cursor = self.cleaned_params.get('cursor')
+        pages = pagination.iter_pages(query, cursor, batch_size=batch_size, **query_options)
+
+        self.response.set_status(200)
+        self.set_response_headers()
+        self.response.headers['Content-Type'] = NDJSON_CONTENT_TYPE
+        self.add_vary('Accept')
+        self.write_stream(self.stream_ndjson(pages, rules, cursor=cursor, max_results=max_results,
+                                             deadline=deadline))
+
+    def stream_ndjson(self, pages, rules, cursor=None, max_results=None, deadline=None):
+        """
+        Generator to write one line per resource followed by a trailer line, i.e.
+        {"_trailer": {"count": 1000, "more": true, "next_cursor": "..."}}
+
+        next_cursor resumes after the last page written in full, even once more is false (i.e. to
+        sync entities added since). Lines are written a page at a time, so an error (reported as
+        "error" in the trailer) never leaves a page half written.
+        :param pages: An iterator of (entities, next urlsafe cursor, more) pages
+        :param cursor: The Cursor the export started at
+        :param deadline: The time.time() to stop at once the current page is written
+        """
+
+        codec = get_codec()
+        serializer = get_serializer(rules)
+        verbose = self.cleaned_params.get('verbose', False)
+        fields = self.cleaned_params.get('fields')
+
+        trailer = {'count': 0, 'more': True, 'next_cursor': cursor and cursor.urlsafe()}
+
+        try:
+            for objs, next_cursor, more in pages:
+                results = serializer.to_list(objs, verbose=verbose, fields=fields)
+                yield ''.join([codec.encode(result) + '\n' for result in results])
+
+                trailer.update({'count': trailer['count'] + len(results), 'more': more,
+                                'next_cursor': next_cursor})
+
+                if max_results and trailer['count'] >= max_results:
+                    break
+                if deadline and time.time() >= deadline:
+                    break
+        except Exception, e:
+            logging.exception(e)
+            trailer['error'] = unicode(e)
+
+        yield codec.encode({'_trailer': trailer}) + '\n'
+
+    def get_projection(self, model_class, rules=None):
+        """
+        Get the ndb query projection needed to serialize entities of model_class for this request
+        :param rules: The rules list to output - defaults to get_rules()
+        :returns: A list of property names or None if full entities are needed
+        """
+
+        if rules is None:
+            rules = self.get_rules()
+
+        return get_projection(model_class, rules, verbose=self.cleaned_params.get('verbose', False),
+                              fields=self.cleaned_params.get('fields'))
+
+    def get_cache_kind(self):
+        """
+        Get the resource kind cached responses are grouped under for invalidation
+        """
+
+        if self.cache_kind:
+            return self.cache_kind
+        if self.cache_ttl:
+            return self.__class__.__name__
+        return None
+
+    def get_cache_scope(self):
+        """
+        Scope cached responses to who is asking
+        Cached responses are served without running the handler (and any permission checks in
+        it), so by default they are scoped to a hash of the request's credentials - the
+        Authorization and Cookie headers. Only anonymous requests share a scope. Override this
+        to share responses more widely, i.e. by user id or permission set.
+        """
+
+        credentials = [self.request.headers.get('Authorization', ''),
+                       self.request.headers.get('Cookie', '')]
+        if not any(credentials):
+            return ''
+        return hashlib.md5('\n'.join(credentials)).hexdigest()
+
+    def get_cache_key(self):
+        """
+        Get the response cache key for this request
+        """
+
+        kind = self.get_cache_kind()
+
+        params = dict(self.params)
+        params[u'__path__'] = self.request.path
+        params[u'__scope__'] = self.get_cache_scope()
+
+        content_type = self.get_response_codec().content_type
+        if content_type != JSON_CONTENT_TYPE:
+            params[u'__content_type__'] = content_type
+
+        prefix = '%s_%s' % (kind, rest_cache.get_generation(kind))
+        return rest_utils.create_request_key(prefix, params)
+
+    def serve_from_cache(self):
+        """
+        Serve the response from the response cache if possible
+        :returns: True if the response was served
+        """
+
+        if not (self.cache_ttl and self.request.method in ('GET', 'HEAD')):
+            return False
+
+        if self.wants_ndjson():
+            return False  # Only JSON responses are cached
+
+        self.cache_key = self.get_cache_key()
+        output = rest_cache.get_cache_backend().get(self.cache_key)
+        if output is None:
+            return False
+
+        self.response.set_status(200)
+        self.set_response_headers()
+        self.write_output(output)
+        return True
+
+    def get_resource_version(self):
+        """
+        Get a cheap version token for the resource(s) this GET request would return, if known
+        Override this (i.e. with a modified timestamp) to answer conditional GETs without running
+        the handler or serializing. By default the ETag is a hash of the encoded response.
+        """
+
+        return None
+
+    def serve_if_not_modified(self):
+        """
+        Serve a 304 if the client already has the current version of the resource
+        :returns: True if the response was served
+        """
+
+        if self.request.method not in ('GET', 'HEAD') or self.wants_ndjson():
+            return False
+
+        version = self.get_resource_version()
+        if version is None:
+            return False
+
+        # The representation also depends on the query params and the negotiated codec
+        params = dict(self.params)
+        content_type = self.get_response_codec().content_type
+        if content_type != JSON_CONTENT_TYPE:
+            params[u'__content_type__'] = content_type
+
+        version_key = rest_utils.create_request_key(unicode(version), params)
+        self.etag = hashlib.md5(version_key).hexdigest()
+
+        # Compressed responses carry the ETag suffixed with their encoding - see write_output.
+        # Whether a body is compressed depends on its size, which is the same for the same version.
+        etags = [self.etag]
+        content_encoding = self.get_content_encoding()
+        if content_encoding:
+            etags.append('%s-%s' % (self.etag, content_encoding))
+
+        for etag in etags:
+            if etag in self.request.if_none_match:
+                self.serve_not_modified(etag)
+                return True
+        return False
+
+    def serve_not_modified(self, etag):
+        """Serve up a bodiless 304 Response"""
+
+        self.response.set_status(304)
+        self.set_response_headers()
+        self.response.etag = etag
+        self.response.clear()
 
     def dispatch(self):
         """
@@ -54,32 +461,55 @@ class RestHandlerBase(webapp2.RequestHandler):
             self.cleaned_data = {}
             self.params = {}
             self.cleaned_params = {}
+            self.cache_key = None
+            self.etag = None
+            self.response_codec = None
+            self.timer = timing.get_timer()
+
+            middleware = rest_utils.get_middleware_pipeline()
 
             # Process Request Payload
-            rest_utils.apply_middleware(self.request, 'process_request')
+            self.timer.add_middleware('process_request',
+                                      middleware.run('process_request', self.request))
 
             # Convert: body into native format
             if len(self.request.body) > 0:
-                if 'application/json' in self.request.headers['Content-Type']:
-                    self.data = json.loads(self.request.body)
-                elif 'multipart/form-data' in self.request.headers['Content-Type']:
-                    # TODO: We prob don't want this? it's for uploading files...
-                    self.data = self.request.POST.mixed()
-                    logging.error(self.data)
+                with self.timer.phase('decode'):
+                    binary_codec = get_binary_codec(self.request.content_type)
+                    if binary_codec:
+                        self.data = binary_codec.decode(self.request.body)
+                    elif 'application/json' in self.request.headers['Content-Type']:
+                        self.data = get_codec().decode(self.request.body)
+                    elif 'multipart/form-data' in self.request.headers['Content-Type']:
+                        # TODO: We prob don't want this? it's for uploading files...
+                        self.data = self.request.POST.mixed()
+                        logging.error(self.data)
 
             # Query parameters
-            self.params = self.request.GET.mixed()
-            self.validate_params()
+            with self.timer.phase('params'):
+                self.params = self.request.GET.mixed()
+                self.validate_params()
 
             # Validate incoming payload
             if self.request.method in ('POST', 'PUT'):
-                self.validate_payload()
+                with self.timer.phase('payload'):
+                    self.validate_payload()
 
-            # Attempt to run handler
-            super(RestHandlerBase, self).dispatch()
+            # Attempt to run handler - waiting on it if it returns a future (i.e. is a tasklet)
+            with self.timer.phase('handler'):
+                if not (self.serve_if_not_modified() or self.serve_from_cache()):
+                    result = super(RestHandlerBase, self).dispatch()
+                    if isinstance(result, ndb.Future):
+                        result.get_result()
+
+            # Invalidate cached responses of this kind on successful writes
+            if (self.request.method in ('POST', 'PUT', 'DELETE') and
+                    self.response.status_int < 400 and self.get_cache_kind()):
+                rest_cache.invalidate(self.get_cache_kind())
 
             # Process Response Payload
-            rest_utils.apply_middleware(self.response, 'process_response')
+            self.timer.add_middleware('process_response',
+                                      middleware.run('process_response', self.response))
 
         except (rest_exceptions.DoesNotExistException,
                 core_exceptions.DoesNotExistException), e:
@@ -99,12 +529,48 @@ class RestHandlerBase(webapp2.RequestHandler):
         except Exception, e:
             self.serve_error(e)  # status=500 for clarity?
 
+        if self.timer.enabled:
+            self.report_timing()
+
+    def report_timing(self):
+        """
+        Output the request's phase timings in a Server-Timing header and to the stats sink
+        The handler phase includes the serialize, encode and compress phases run inside it.
+        """
+
+        self.timer.add('total', self.timer.get_elapsed())
+
+        if API_SERVER_TIMING_ENABLED:
+            self.response.headers['Server-Timing'] = self.timer.get_header()
+
+            origin = self.response.headers.get('Access-Control-Allow-Origin')
+            if origin:
+                self.response.headers['Timing-Allow-Origin'] = origin
+
+        sink = timing.get_stats_sink()
+        if sink:
+            sink.record(self.__class__.__name__, self.request.method, self.response.status_int,
+                        self.timer.timings.items())
+
     def options(self, *args, **kwargs):
         """
         Called for ajax calls for most browsers in X-Origin
+        Preflight responses are cacheable by the browser for API_CORS_MAX_AGE seconds
         """
         self.serve_response(200, [])
 
+        if API_CORS_MAX_AGE is not None:
+            self.response.headers['Access-Control-Max-Age'] = str(API_CORS_MAX_AGE)
+
+    def head(self, *args, **kwargs):
+        """
+        Serve the headers of the GET response without the body
+        """
+
+        if not hasattr(self, 'get'):
+            self.abort(405)
+        return self.get(*args, **kwargs)
+
     def serve_success(self, result, extra_fields={}):
         """Serve up a 200 response"""
         self.serve_response(200, result, extra_fields=extra_fields)
@@ -121,18 +587,122 @@ class RestHandlerBase(webapp2.RequestHandler):
         exc_type, exc_value, exc_traceback = sys.exc_info()
         formatted_lines = traceback.format_exc().splitlines()
 
-        self.serve_response(status, formatted_lines, messages=[unicode(exception)])
+        extra_fields = {}
+        if isinstance(exception, rest_exceptions.PayloadValidationException):
+            extra_fields['errors'] = exception.errors
+
+        self.serve_response(status, formatted_lines, messages=[unicode(exception)],
+                            extra_fields=extra_fields)
         logging.exception(exception)
 
     def serve_response(self, status, result, messages=None, extra_fields={}):
-        """Serve the response"""
-
-        allow_header_values = "Authorization, Origin, X-Requested-With, Content-Type, Accept"
+        """
+        Serve the response
+        If result is an iterator (i.e. a generator), the response is streamed - see stream_payload
+        If result is a ResourceRows, the envelope gets its columns and _meta once and results is
+        a list of positional rows.
+        The body is encoded with the negotiated codec - see get_response_codec. Binary codecs
+        cannot stream so iterators are collected first.
+        """
 
         if (not isinstance(messages, list)):
             messages = [messages]
 
         self.response.set_status(status)
+        self.set_response_headers()
+
+        # TODO: Validate that extra_fields doesn't contain bad props - collisions
+        payload = dict(extra_fields)
+        payload.update({'status': status, 'messages': messages})
+
+        codec = self.get_response_codec()
+
+        if is_result_stream(result):
+            if codec.streamable:
+                self.write_stream(self.stream_payload(payload, result))
+                return
+            result = list(result)
+
+        if isinstance(result, ResourceRows):
+            payload['columns'] = result.columns
+            if result.meta is not None:
+                payload['_meta'] = result.meta
+            result = result.rows
+
+        payload['results'] = result
+
+        with self.timer.phase('encode'):
+            output = codec.encode(payload, pretty=bool(self.request.GET.get('pretty')))
+        self.write_output(output)
+
+        # The body is already written, so failing to cache it (i.e. over 1MB) is only logged
+        if getattr(self, 'cache_key', None) and status == 200:
+            rest_cache.safe_set(self.cache_key, output, ttl=self.cache_ttl)
+
+    def write_output(self, output):
+        """
+        Write an encoded response body
+        Successful GET responses get an ETag and a 304 if it matches If-None-Match.
+        HEAD responses get the headers of the GET response but no body.
+        """
+
+        if isinstance(output, unicode):
+            output = output.encode('utf-8')
+
+        content_encoding = None
+        if len(output) >= API_COMPRESSION_MIN_SIZE:
+            content_encoding = self.get_content_encoding()
+
+        if self.response.status_int == 200 and self.request.method in ('GET', 'HEAD'):
+            etag = getattr(self, 'etag', None) or hashlib.md5(output).hexdigest()
+            if content_encoding:
+                etag = '%s-%s' % (etag, content_encoding)  # Each encoding is its own entity
+            self.response.etag = etag
+
+            if etag in self.request.if_none_match:
+                self.serve_not_modified(etag)
+                return
+
+        if content_encoding:
+            with self.timer.phase('compress'):
+                output = rest_utils.compress(output, content_encoding, level=API_COMPRESSION_LEVEL)
+            self.response.headers['Content-Encoding'] = content_encoding
+
+        if self.request.method == 'HEAD':
+            self.response.content_length = len(output)
+            return
+
+        self.response.write(output)
+
+    def write_stream(self, chunks):
+        """
+        Stream an iterable of encoded `str` chunks as the response body, compressing as it goes
+        """
+
+        content_encoding = self.get_content_encoding()
+        if content_encoding:
+            chunks = rest_utils.compress_iter(chunks, content_encoding,
+                                              level=API_COMPRESSION_LEVEL)
+            self.response.headers['Content-Encoding'] = content_encoding
+
+        self.response.app_iter = chunks
+
+    def get_content_encoding(self):
+        """
+        Negotiate the compression for the response body, if compression is enabled
+        """
+
+        if not API_COMPRESSION_ENABLED:
+            return None
+
+        return rest_utils.choose_content_encoding(self.request.headers.get('Accept-Encoding'))
+
+    def set_response_headers(self):
+        """
+        Set the CORS and content headers for the response
+        """
+
+        allow_header_values = "Authorization, Origin, X-Requested-With, Content-Type, Accept"
 
         # Determine origin bits
         request_origin = self.request.headers.get('Origin') or self.request.referer
@@ -142,19 +712,64 @@ class RestHandlerBase(webapp2.RequestHandler):
         if origin_in_whitelist:
             response_origin = request_origin  # Input origin is good, so passthru
 
-        # TODO: Validate that extra_fields doesn't contain bad props - collisions
-        payload = extra_fields
-        payload.update({'status': status, 'results': result, 'messages': messages})
-
         self.response.headers['Access-Control-Allow-Origin'] = response_origin
+        # Allow-Origin depends on the request origin and the body on the accepted encodings
+        # and, with binary codecs available, the accepted content types
+        vary = ['Origin']
+        if API_COMPRESSION_ENABLED:
+            vary.append('Accept-Encoding')
+        if get_binary_content_types():
+            vary.append('Accept')
+        self.response.headers['Vary'] = ', '.join(vary)
         self.response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE'
         self.response.headers['Access-Control-Allow-Credentials'] = 'true'
-        self.response.headers['Content-Type'] = 'application/json'
+        self.response.headers['Content-Type'] = self.get_response_codec().content_type
         self.response.headers['Access-Control-Allow-Headers'] = allow_header_values
 
-        if (self.request.GET.get('pretty')):
-            output_json = json.dumps(payload, sort_keys=True, indent=4, separators=(',', ': '))
-        else:
-            output_json = json.dumps(payload, sort_keys=True)
+    def add_vary(self, header):
+        """
+        Add a request header to the response's Vary header if it is not already there
+        """
+
+        vary = self.response.headers.get('Vary')
+        if not vary:
+            self.response.headers['Vary'] = header
+        elif header not in [value.strip() for value in vary.split(',')]:
+            self.response.headers['Vary'] = '%s, %s' % (vary, header)
+
+    def stream_payload(self, payload, results):
+        """
+        Generator to write the response envelope incrementally, one result at a time
+
+        The envelope keys are written first (sorted), then `results`, then `messages` so that an
+        error raised while iterating results can still be reported. The status has already been
+        sent at that point, so clients must check `messages` on streamed responses.
+        Note: Streamed output is never pretty printed.
+        """
+
+        codec = get_codec()
+        messages = payload.pop('messages')
+
+        yield '{'
+        for key in sorted(payload.keys()):
+            yield '%s: %s, ' % (codec.encode(key), codec.encode(payload[key]))
+
+        yield '"results": ['
+        try:
+            for i, result in enumerate(results):
+                if i:
+                    yield ', '
+                yield codec.encode(result)
+        except Exception, e:
+            logging.exception(e)
+            messages = messages + [unicode(e)]
+
+        yield '], "messages": %s}' % codec.encode(messages)
+
+
+def is_result_stream(result):
+    """
+    Determine if a result should be streamed rather than encoded in one go
+    """
 
-        self.response.write(output_json)
+    return hasattr(result, '__iter__') and not isinstance(result, (list, tuple, dict, set))
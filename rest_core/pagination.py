@@ -0,0 +1,155 @@
+"""
+Cursor pagination for collection endpoints
+"""
+
+import logging
+import voluptuous
+from google.appengine.datastore.datastore_query import Cursor
+
+from constants import API_PAGE_DEFAULT_LIMIT, API_PAGE_MAX_LIMIT, API_PAGE_PREFETCH_TTL
+from constants import API_EXPORT_BATCH_SIZE
+from params import coerce_to_cursor
+from resources import get_serializer
+import cache as rest_cache
+import utils as rest_utils
+
+# Merge into a handler's get_param_schema to accept the params serve_page reads
+PARAM_SCHEMA = {
+    'cursor': coerce_to_cursor,
+    'limit': voluptuous.All(voluptuous.Coerce(int),
+                            voluptuous.Range(min=1, max=API_PAGE_MAX_LIMIT)),
+}
+
+
+def paginate(query, cursor, limit, rules, verbose=False, fields=None, rows=False, prefetch=False,
+             cache_kind=None, native=False, **query_options):
+    """
+    Fetch and serialize a page of a query
+    :param cursor: The cleaned cursor param - a Cursor, urlsafe str or None for the first page
+    :param limit: The cleaned limit param - defaults to REST_PAGE_DEFAULT_LIMIT
+    :param rows: Output results as a ResourceRows of positional rows rather than dicts
+    :param prefetch: Start fetching the following page while this page is serialized and cache
+        it for REST_PAGE_PREFETCH_TTL seconds for the follow up request. Only pages paginated
+        with prefetch look for a prefetched page, so others skip the cache lookups entirely.
+    :param cache_kind: The kind to group prefetched pages under for invalidation (see
+        cache.invalidate) - defaults to the query kind. Only cache.invalidate(kind) drops them,
+        which dispatch calls for writes to handlers with that cache_kind. Call it after other
+        writes to the kind, or prefetched pages may be stale for up to REST_PAGE_PREFETCH_TTL.
+    :param native: Output native values for binary codecs - see ResourceSerializer.get_selection
+    :param query_options: Passed on to fetch_page, i.e. projection
+    :returns: A dict envelope of {'results': [...], 'next_cursor': str or None, 'more': bool}
+    """
+
+    objs, next_cursor, more = fetch_page(query, cursor, limit, cache_kind=cache_kind,
+                                         use_prefetched=prefetch, **query_options)
+
+    next_page = None
+    if prefetch and more:
+        next_page = prefetch_page_async(query, next_cursor, limit, cache_kind=cache_kind,
+                                        **query_options)
+
+    serializer = get_serializer(rules)
+    if rows:
+        results = serializer.to_rows(objs, verbose=verbose, fields=fields, native=native)
+    else:
+        results = serializer.to_list(objs, verbose=verbose, fields=fields, native=native)
+
+    # The prefetch is speculative - failing it must not fail the requested page
+    if next_page is not None:
+        next_page.wait()
+        if next_page.get_exception():
+            logging.warning('Failed to prefetch the next page: %s', next_page.get_exception())
+
+    return {'results': results, 'next_cursor': next_cursor if more else None, 'more': more}
+
+
+def fetch_page(query, cursor=None, limit=None, cache_kind=None, use_prefetched=False,
+               **query_options):
+    """
+    Fetch a page of a query
+    :param use_prefetched: Use a page cached by prefetch_page_async if there is one
+    :returns: A tuple of (entities, next urlsafe cursor or None, more)
+    """
+
+    cursor = _to_cursor(cursor)
+    limit = limit or API_PAGE_DEFAULT_LIMIT
+
+    # Only pages after the first are ever prefetched
+    if use_prefetched and cursor:
+        cache_key = _get_page_key(query, cursor, limit, cache_kind, query_options)
+        page = rest_cache.get_cache_backend().get(cache_key)
+        if page is not None:
+            return page
+
+    objs, next_cursor, more = query.fetch_page(limit, start_cursor=cursor, **query_options)
+    return (objs, next_cursor and next_cursor.urlsafe(), more)
+
+
+def prefetch_page_async(query, cursor, limit=None, cache_kind=None, **query_options):
+    """
+    Start fetching a page of a query and cache it for a follow up fetch_page once it resolves
+    Caching is best effort (see cache.safe_set), i.e. pages over memcache's 1MB limit are not.
+    :returns: The ndb Future of the fetch
+    """
+
+    cursor = _to_cursor(cursor)
+    limit = limit or API_PAGE_DEFAULT_LIMIT
+
+    cache_key = _get_page_key(query, cursor, limit, cache_kind, query_options)
+    future = query.fetch_page_async(limit, start_cursor=cursor, **query_options)
+
+    def cache_page(future):
+        if future.get_exception():
+            return
+
+        objs, next_cursor, more = future.get_result()
+        page = (objs, next_cursor and next_cursor.urlsafe(), more)
+        rest_cache.safe_set(cache_key, page, ttl=API_PAGE_PREFETCH_TTL)
+
+    future.add_immediate_callback(cache_page, future)
+    return future
+
+
+def iter_pages(query, cursor=None, batch_size=None, **query_options):
+    """
+    Generator paging through a whole query, fetching each page while the previous is processed
+    :param batch_size: Entities per page - defaults to REST_EXPORT_BATCH_SIZE
+    :returns: Yields (entities, next urlsafe cursor or None, more) tuples
+    """
+
+    cursor = _to_cursor(cursor)
+    batch_size = batch_size or API_EXPORT_BATCH_SIZE
+
+    future = query.fetch_page_async(batch_size, start_cursor=cursor, **query_options)
+    while future is not None:
+        objs, next_cursor, more = future.get_result()
+        more = bool(more and next_cursor)
+
+        future = None
+        if more:
+            future = query.fetch_page_async(batch_size, start_cursor=next_cursor, **query_options)
+
+        yield objs, next_cursor and next_cursor.urlsafe(), more
+
+
+def _to_cursor(cursor):
+    if not cursor or isinstance(cursor, Cursor):
+        return cursor or None
+    return coerce_to_cursor(cursor)
+
+
+def _get_page_key(query, cursor, limit, cache_kind, query_options):
+    """
+    Build the cache key of a page - scoped to the kind's cache generation so writes invalidate it
+    """
+
+    kind = cache_kind or query.kind
+    prefix = 'page_%s_%s' % (kind, rest_cache.get_generation(kind))
+
+    params = {
+        u'query': repr(query),
+        u'options': repr(sorted(query_options.items())),
+        u'cursor': cursor and cursor.urlsafe(),
+        u'limit': limit,
+    }
+    return rest_utils.create_request_key(prefix, params)
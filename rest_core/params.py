@@ -1,23 +1,44 @@
 import voluptuous
 from google.appengine.datastore.datastore_query import Cursor
 import datetime
-from pytz import timezone
+import re
+import pytz
+
+UTC = pytz.utc
+RESPONSE_FORMATS = ('objects', 'rows')  # Shapes of collection results - see ResourceRows
+DATETIME_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'
+                         r'(?:[T ](\d{1,2}):(\d{1,2})(?::(\d{1,2})(?:\.(\d{1,6})\d*)?)?'
+                         r'(Z|[+-]\d{2}(?::?\d{2})?)?)?\Z')
 
 
 class ResourceParams(object):
     def __init__(self, schema):
         self.param_schema = schema
+        self._schema = None  # Compiled schema - see get_schema
+
+    def get_schema(self):
+        """
+        Get the compiled voluptuous Schema including the built in params, compiling on first use
+        A handler's own fields or format param is kept rather than replaced by the built in one.
+        Note: This does not modify the given param schema dict
+        """
+
+        if self._schema is None:
+            param_schema = dict(self.param_schema)
+            param_schema['pretty'] = voluptuous.Coerce(bool)
+            param_schema['verbose'] = voluptuous.Coerce(bool)
+            param_schema.setdefault('fields', coerce_to_field_list)
+            param_schema.setdefault('format', voluptuous.Any(*RESPONSE_FORMATS))
+
+            self._schema = voluptuous.Schema(param_schema)
+        return self._schema
 
     def from_dict(self, input_params):
         """
         :param input_params dict:
         """
-        self.param_schema['pretty'] = voluptuous.Coerce(bool)
-        self.param_schema['verbose'] = voluptuous.Coerce(bool)
-
-        schema = voluptuous.Schema(self.param_schema)
-        validated_params = schema(input_params)
 
+        validated_params = self.get_schema()(input_params)
         return validated_params
 
 
@@ -33,24 +54,68 @@ def coerce_to_cursor(val):
     return cursor
 
 
+def coerce_to_field_list(val):
+    """
+    Helper to convert a comma separated string (or list of strings) of field keys to a list
+    """
+
+    if not val:
+        return None
+
+    if isinstance(val, basestring):
+        val = val.split(',')
+
+    if not isinstance(val, (list, tuple)):
+        raise voluptuous.Invalid('fields must be a comma separated string of field keys')
+
+    fields = []
+    for field in val:
+        if not isinstance(field, basestring):
+            raise voluptuous.Invalid('fields must be a comma separated string of field keys')
+
+        field = field.strip()
+        if field:
+            fields.append(field)
+
+    return fields or None
+
+
 def coerce_to_datetime(dtstr):
     """
     Helper to convert a input datetime string to a UTC datetime
+    Accepts ISO 8601 dates (YYYY-MM-DD) and datetimes (YYYY-MM-DDTHH:MM[:SS[.ffffff]]) with an
+    optional Z or +HH:MM offset. Datetimes without an offset are taken to be UTC.
     """
 
     if not dtstr:
         return None
 
-    try:
-        fmt = '%Y-%m-%dT%H:%M:%SZ'
-        dt = datetime.datetime.strptime(dtstr, fmt)
-    except ValueError:
-        # Attempt full day method
-        fmt = '%Y-%m-%d'
-        dt = datetime.datetime.strptime(dtstr, fmt)
+    if isinstance(dtstr, datetime.datetime):
+        # Binary codecs decode datetimes natively
+        if dtstr.tzinfo is None:
+            return dtstr.replace(tzinfo=UTC)
+        return dtstr.astimezone(UTC)
+
+    match = DATETIME_RE.match(dtstr)
+    if not match:
+        raise ValueError('Invalid ISO 8601 datetime "%s"' % dtstr)
+
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+
+    microsecond = 0
+    if fraction:
+        microsecond = int(fraction.ljust(6, '0'))
+
+    dt = datetime.datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+                           int(second or 0), microsecond, UTC)
 
-    dt = timezone('UTC').localize(dt)
-    return dt  # .replace(tzinfo=None)
+    if offset and offset != 'Z':
+        offset_minutes = int(offset[1:3]) * 60 + int(offset[-2:] if len(offset) > 3 else 0)
+        if offset[0] == '-':
+            offset_minutes = -offset_minutes
+        dt -= datetime.timedelta(minutes=offset_minutes)
+
+    return dt
 
 
 def coerce_from_datetime(dt):
@@ -59,4 +124,18 @@ def coerce_from_datetime(dt):
     """
     if not dt:
         return None  # Should this be an empty str?
+
+    if isinstance(dt, datetime.datetime):
+        # isoformat is much faster than strftime; drop any microseconds and offset
+        return dt.isoformat()[:19] + 'Z'
     return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def coerce_from_datetimes(dts):
+    """
+    Helper to convert a list of UTC datetimes to strings - same output as coerce_from_datetime
+    """
+
+    datetime_type = datetime.datetime
+    return [(dt.isoformat()[:19] + 'Z' if type(dt) is datetime_type else coerce_from_datetime(dt))
+            if dt else None for dt in dts]
@@ -0,0 +1,154 @@
+"""
+Opt-in per-field profiling of resource serialization and validation
+
+    field_profiler = profiler.enable()
+    ... serve some requests ...
+    print field_profiler.report()
+    profiler.disable()
+
+While no profiler is enabled, serializers and validation plans skip profiling entirely.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+active_profiler = None  # The enabled FieldProfiler - read by ResourceSerializer and ValidationPlan
+
+
+class FieldProfiler(object):
+    """
+    Cumulative call counts and seconds per resource type, field key and method
+
+    Times are inclusive, so a ResourceField's time includes its nested resource's fields.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, resource_type, key, method, seconds, calls=1):
+        """
+        :param method: 'from_resource' or 'to_resource'
+        :param calls: How many objects the call covered (from_resource_multi covers many)
+        """
+
+        with self.lock:
+            stat = self.stats.setdefault((resource_type, key, method), [0, 0.0])
+            stat[0] += calls
+            stat[1] += seconds
+
+    def call(self, resource_type, key, method, func, *args, **kwargs):
+        """
+        Call func, recording the time it took against the field
+        """
+
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(resource_type, key, method, time.time() - start)
+
+    def wrap_getters(self, getters, resource_type, default, multi=False):
+        """
+        Wrap a FieldSelection's list of (key, getter) pairs so each call is recorded
+        :param default: The getter to use for keys whose getter is None (inlined by serializers)
+        :param multi: If the getters take a list of objects - see RestField.from_resource_multi
+        """
+
+        return [(key, ProfiledGetter(self, resource_type, key, getter or default, multi))
+                for key, getter in getters]
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def get_stats(self):
+        """
+        Get cumulative timings, slowest first
+        :returns: A list of (resource type, field key, method, calls, total seconds) tuples
+        """
+
+        with self.lock:
+            stats = [(resource_type, key, method, calls, seconds)
+                     for (resource_type, key, method), (calls, seconds) in self.stats.items()]
+        return sorted(stats, key=lambda stat: stat[4], reverse=True)
+
+    def report(self, limit=None):
+        """
+        Format the stats as a table, slowest first
+        :param limit: Only include this many of the slowest fields
+        """
+
+        lines = ['%-24s %-24s %-14s %8s %10s %10s' % ('resource type', 'field', 'method', 'calls',
+                                                      'total ms', 'per us')]
+
+        for resource_type, key, method, calls, seconds in self.get_stats()[:limit]:
+            lines.append('%-24s %-24s %-14s %8d %10.2f %10.2f' % (
+                resource_type, key, method, calls, seconds * 1000, seconds * 1000000 / calls))
+
+        return '\n'.join(lines)
+
+    def disable(self):
+        """
+        Stop profiling if this is the enabled profiler
+        """
+
+        global active_profiler
+
+        if active_profiler is self:
+            active_profiler = None
+
+
+class ProfiledGetter(object):
+    """
+    A from_resource or from_resource_multi style getter that records each call
+    """
+
+    def __init__(self, profiler, resource_type, key, getter, multi=False):
+        self.profiler = profiler
+        self.resource_type = resource_type
+        self.key = key
+        self.getter = getter
+        self.multi = multi
+
+    def __call__(self, obj, field, **kwargs):
+        start = time.time()
+        try:
+            return self.getter(obj, field, **kwargs)
+        finally:
+            calls = len(obj) if self.multi else 1
+            self.profiler.record(self.resource_type, self.key, 'from_resource',
+                                 time.time() - start, calls=calls)
+
+
+def enable(profiler=None):
+    """
+    Start profiling every serializer and validation plan in the process
+    :param profiler: The FieldProfiler to record to - a new one by default
+    :returns: The enabled FieldProfiler
+    """
+
+    global active_profiler
+
+    active_profiler = profiler or FieldProfiler()
+    return active_profiler
+
+
+def disable():
+    global active_profiler
+
+    active_profiler = None
+
+
+@contextmanager
+def profile():
+    """
+    Profile a block, i.e. `with profiler.profile() as p: ...` then `print p.report()`
+    """
+
+    field_profiler = enable()
+    try:
+        yield field_profiler
+    finally:
+        field_profiler.disable()
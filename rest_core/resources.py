@@ -6,13 +6,17 @@ Note: This is designed to work similar django Forms - try to keep it that way
 
 import voluptuous
 
+from google.appengine.api import datastore_errors
 from google.appengine.ext import ndb
-import logging
+from functools import partial
 from models import Model
-from params import coerce_to_datetime, coerce_from_datetime
+from params import coerce_to_datetime, coerce_from_datetime, coerce_from_datetimes
+import profiler as rest_profiler
 
 NON_FIELD_ERRORS = '__all__'
 VALID_RESORCE_TYPES = (ndb.Model, dict)  # None: is also allowed
+DEFAULT_RESOURCE_TYPE = 'NonDefinedClass'
+MAX_COMPILED_RULES = 256  # Upper bound on cached compiled rules lists
 
 
 class RestValueException(Exception):
@@ -46,13 +50,6 @@ class OutputOnlyError(Exception):
     pass
 
 
-class ResourceList(object):
-    """
-    List Endpoint helper
-    TODO: Do this yet
-    """
-
-
 class Resource(object):
     """
     Object to represent a REST Resource
@@ -73,12 +70,9 @@ class Resource(object):
             err = 'Resource() requires a instance of %s or None. Received %s, %s.'
             raise TypeError(err % (VALID_RESORCE_TYPES, type(obj), obj))
 
-        self.resource_type = 'NonDefinedClass'
-
-        if (obj and isinstance(obj, Model)):
-            self.resource_type = obj.get_kind()
-        elif (obj and isinstance(obj, ndb.Model)):
-            self.resource_type = obj.key.kind()
+        self.resource_type = DEFAULT_RESOURCE_TYPE  # Dicts have no kind
+        if obj and not isinstance(obj, dict):
+            self.resource_type = get_resource_type(obj)
 
         if not (isinstance(fields, list)):
             err = 'Resource requires list. Received %s, %s.'
@@ -91,71 +85,827 @@ class Resource(object):
         self.errors = {}
         self.cleaned_data = {}
 
-    def from_dict(self, data):
+    def from_dict(self, data, resource_type=None):
         """
         Loads in a Rest Resource from a dictionary of a values
+        :param resource_type: What the input is profiled under - defaults to the object's type
 
         TODO: Add validation at this level too
         TODO: Throw OutputOnlyError if a field is output_only=True
         """
 
-        # First validate that all input keys are allowed input fields
-        allowed_input_field_keys = []
-        required_input_field_keys = []
-        self.cleaned_data = {}
+        if resource_type is None:
+            resource_type = self.resource_type
+
+        plan = get_validation_plan(self.fields)
+        self.cleaned_data = plan.clean(data, resource_type=resource_type)
+        return self.cleaned_data
+
+    def to_dict(self, verbose=False, fields=None, native=False):
+        """
+        Dumps a rest Resource to a dictionary of values
+        :param fields: Optional list of keys to restrict output to - see get_selection
+        :param native: Output native values for binary codecs - see get_selection
+        """
+
+        if not self.obj:
+            return {}
+
+        serializer = get_serializer(self.fields)
+        return serializer.to_dict(self.obj, verbose=verbose, resource_type=self.resource_type,
+                                  fields=fields, native=native)
+
+
+class ResourceList(object):
+    """
+    Object to represent a collection of REST Resources
+
+    Serializes every object in one pass per field rather than one Resource per object, so
+    per-field work (reference lookups, datetime formatting, etc) is batched across the page.
+    """
+
+    def __init__(self, objs, fields):
+        """
+        :param objs:
+            A list or iterator of ndb.Model and/or dict instances
+        """
+
+        if objs is None:
+            objs = []
+
+        # Step 1: Make sure objs is a list so iterators can be walked once per field
+        objs = list(objs)
+
+        # Step 2: Do some type checking
+        for obj in objs:
+            if obj and not isinstance(obj, VALID_RESORCE_TYPES):
+                err = 'ResourceList() requires instances of %s or None. Received %s, %s.'
+                raise TypeError(err % (VALID_RESORCE_TYPES, type(obj), obj))
+
+        if not (isinstance(fields, list)):
+            err = 'ResourceList requires list. Received %s, %s.'
+            raise TypeError(err % (type(list), fields))
+
+        # Step 3:  Set params as instance properties
+        self.objs = objs
+        self.fields = fields
+
+    def to_list(self, verbose=False, fields=None, native=False):
+        """
+        Dumps the collection to a list of dictionaries - same output as Resource.to_dict per object
+        """
+
+        serializer = get_serializer(self.fields)
+        return serializer.to_list(self.objs, verbose=verbose, fields=fields, native=native)
+
+    def to_rows(self, verbose=False, fields=None, native=False):
+        """
+        Dumps the collection to a ResourceRows of positional rows - see ResourceSerializer.to_rows
+        """
+
+        serializer = get_serializer(self.fields)
+        return serializer.to_rows(self.objs, verbose=verbose, fields=fields, native=native)
+
+
+def iter_resources(objs, fields, verbose=False, batch_size=100, selected_fields=None,
+                   native=False):
+    """
+    Generator to serialize an iterable of objects in batches - i.e. for streaming responses
+    Only one batch of objects and their dicts is held at a time.
+    :param selected_fields: Optional list of keys to restrict output to - see get_selection
+    :param native: Output native values for binary codecs - see get_selection
+    """
+
+    serializer = get_serializer(fields)
+
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+
+        if len(batch) >= batch_size:
+            for result in serializer.to_list(batch, verbose=verbose, fields=selected_fields,
+                                             native=native):
+                yield result
+            batch = []
+
+    if batch:
+        for result in serializer.to_list(batch, verbose=verbose, fields=selected_fields,
+                                         native=native):
+            yield result
+
+
+INPUT_ERRORS = (UnknownFieldError, RequiredFieldError, OutputOnlyError, RestValueException)
+
+
+class ResourceSerializer(object):
+    """
+    A rules list compiled for output - build once and reuse for many objects
+
+    Resolves the output keys, the verbose and non-verbose field subsets and the per-field getters
+    up front so serializing an object is a single pass over a prebuilt list.
+    Use get_serializer(fields) to share compiled serializers across requests.
+    """
+
+    def __init__(self, fields):
+        if not (isinstance(fields, list)):
+            err = 'ResourceSerializer requires list. Received %s, %s.'
+            raise TypeError(err % (type(fields), fields))
+
+        self.fields = fields
+        self.keys = [field.key for field in fields]
+
+        verbose_fields = fields
+        non_verbose_fields = [field for field in fields if not field.verbose_only]
+
+        self.has_verbose_only = len(non_verbose_fields) != len(verbose_fields)
+        self.verbose_selection = FieldSelection(verbose_fields, is_verbose=True)
+        self.non_verbose_selection = FieldSelection(non_verbose_fields,
+                                                    is_verbose=not self.has_verbose_only)
+
+        self._selections = {}  # Compiled selections for requested fields lists
+
+    def get_selection(self, verbose=False, fields=None, native=False):
+        """
+        Get the compiled FieldSelection for a verbosity or a list of requested fields
+        :param fields: A list of field keys to output, with dotted paths (i.e. 'author.name')
+            selecting fields of ResourceFields. Takes precedence over verbose.
+        :param native: Output the raw datetimes and GeoPts of fields with native_output, for
+            codecs that encode them natively (i.e. msgpack), rather than formatting them
+        """
+
+        if not fields and not native:
+            return self.verbose_selection if verbose else self.non_verbose_selection
+
+        paths = tuple(sorted(set(fields))) if fields else bool(verbose)
+        selection = self._selections.get((paths, native))
+        if selection is None:
+            if len(self._selections) >= MAX_COMPILED_RULES:
+                self._selections.clear()
+
+            if fields:
+                selection = self._compile_selection(paths, native=native)
+            else:
+                base = self.verbose_selection if verbose else self.non_verbose_selection
+                selection = FieldSelection(base.fields, is_verbose=base.is_verbose, native=True)
+            self._selections[(paths, native)] = selection
+        return selection
+
+    def _compile_selection(self, paths, native=False):
+        """
+        Compile a FieldSelection for a list of requested field paths
+        """
+
+        requested_keys = set()
+        whole_keys = set()
+        subfields = {}
+
+        for path in paths:
+            key, _, subpath = path.partition('.')
+            requested_keys.add(key)
+
+            if subpath:
+                subfields.setdefault(key, []).append(subpath)
+            else:
+                whole_keys.add(key)
+
+        for key in whole_keys:
+            subfields.pop(key, None)  # Requesting a field outright wins over its sub fields
+
+        selected_fields = [field for field in self.fields if field.key in requested_keys]
+        omitted_keys = [field.key for field in self.fields if field.key not in requested_keys]
+
+        return FieldSelection(selected_fields, is_verbose=not omitted_keys,
+                              omitted_fields=omitted_keys, subfields=subfields, native=native)
+
+    def get_projection(self, model_class, verbose=False, fields=None):
+        """
+        Get the datastore property names read to output entities of model_class
+        :returns: A list of property names or None if the output needs full entities
+        """
+
+        selection = self.get_selection(verbose, fields)
+
+        if model_class not in selection.projections:
+            selection.projections[model_class] = selection.compile_projection(model_class)
+        return selection.projections[model_class]
+
+    def get_objs_selection(self, objs, verbose=False, fields=None, native=False):
+        """
+        Get the FieldSelection to output objs with - see get_selection
+        Projected entities narrow it to the fields their projection can output (see
+        FieldSelection.get_projected), so a list with any projected entity omits the rest.
+        :param objs: A list of objects - falsy objects are not allowed
+        """
+
+        selection = self.get_selection(verbose, fields, native)
+
+        projections = set((type(obj), obj._projection) for obj in objs
+                          if isinstance(obj, ndb.Model) and obj._projection)
+        if not projections:
+            return selection
+
+        for model_class, projection in sorted(projections, key=lambda p: (p[0].__name__, p[1])):
+            selection = selection.get_projected(model_class, projection)
+        return selection
+
+    def prefetch_async(self, objs, verbose=False, fields=None, native=False):
+        """
+        Start the batched fetches of every field for objs so they run concurrently
+        Pass the same selection arguments as the to_list or to_rows call the result is for.
+        :returns: A dict of field key to the field's pending prefetch
+        """
+
+        objs = [obj for obj in objs if obj]
+        return self._prefetch_async(objs, self.get_objs_selection(objs, verbose, fields, native))
+
+    def _prefetch_async(self, objs, selection):
+        if not selection.prefetchers:
+            return {}
+
+        return dict((key, field.prefetch_async(objs)) for key, field in selection.prefetchers)
+
+    def to_dict(self, obj, verbose=False, resource_type=None, fields=None, native=False):
+        """
+        Dumps a single object to a dictionary of values - same output as Resource.to_dict
+        """
+
+        result = {}
+
+        if not obj:
+            return result
+
+        is_dict = isinstance(obj, dict)
+        if not (is_dict or isinstance(obj, VALID_RESORCE_TYPES)):
+            err = 'ResourceSerializer requires a instance of %s or None. Received %s, %s.'
+            raise TypeError(err % (VALID_RESORCE_TYPES, type(obj), obj))
+
+        if fields or native:
+            selection = self.get_selection(verbose, fields, native)
+        else:
+            selection = self.verbose_selection if verbose else self.non_verbose_selection
+
+        if not is_dict and obj._projection:
+            selection = selection.get_projected(type(obj), obj._projection)
+        getters = selection.getters
+
+        if resource_type is None:
+            resource_type = get_resource_type(obj)
+
+        profiler = rest_profiler.active_profiler
+        if profiler is not None:
+            getters = profiler.wrap_getters(getters, resource_type, _default_getter)
+
+        if is_dict:
+            for key, getter in getters:
+                if getter is None:
+                    result[key] = obj.get(key, None)
+                else:
+                    result[key] = getter(obj, key)
+        elif obj._projection:
+            # Projected entities raise for properties left out of the projection
+            for key, getter in getters:
+                if getter is None:
+                    result[key] = _get_attr(obj, key)
+                else:
+                    result[key] = getter(obj, key)
+        else:
+            for key, getter in getters:
+                if getter is None:
+                    result[key] = getattr(obj, key, None)
+                else:
+                    result[key] = getter(obj, key)
+
+        result['_meta'] = selection.get_meta(resource_type)
+        return result
+
+    def to_list(self, objs, verbose=False, fields=None, prefetches=None, native=False):
+        """
+        Dumps a list of objects to a list of dictionaries, one field (column) at a time
+
+        Each field's from_resource_multi is called once with every object so fields can batch
+        their work across the whole list.
+        :param prefetches: The result of prefetch_async for objs if already started
+        """
+
+        objs = list(objs)
+        results = [{} for obj in objs]
+
+        # Falsy objects serialize to {} just like Resource.to_dict
+        present = [i for i, obj in enumerate(objs) if obj]
+        if not present:
+            return results
+
+        if len(present) != len(objs):
+            objs = [objs[i] for i in present]
+
+        selection = self.get_objs_selection(objs, verbose, fields, native)
+        rows = [results[i] for i in present]
+
+        for key, values in self._get_columns(objs, selection, prefetches):
+            for row, value in zip(rows, values):
+                row[key] = value
+
+        for row, obj in zip(rows, objs):
+            row['_meta'] = selection.get_meta(get_resource_type(obj))
+
+        return results
+
+    def to_rows(self, objs, verbose=False, fields=None, prefetches=None, native=False):
+        """
+        Dumps a list of objects to positional rows - the columnar form of to_list
+        Falsy objects output None rather than a row. The _meta of the rows is hoisted to the
+        ResourceRows rather than repeated per row, unless objs are of mixed resource types. Then
+        each row ends with its own _meta in a trailing '_meta' column and ResourceRows.meta is None.
+        :returns: A ResourceRows
+        """
+
+        objs = list(objs)
+        present_objs = [obj for obj in objs if obj]
+
+        selection = self.get_objs_selection(present_objs, verbose, fields, native)
+        column_keys = [key for key, getter in selection.multi_getters]
+
+        if not present_objs:
+            return ResourceRows(column_keys, [None] * len(objs), {})
+
+        columns = self._get_columns(present_objs, selection, prefetches)
+
+        resource_types = [get_resource_type(obj) for obj in present_objs]
+        if len(set(resource_types)) == 1:
+            meta = selection.get_meta(resource_types[0])
+        else:
+            meta = None
+            column_keys = column_keys + ['_meta']
+            columns.append(('_meta', [selection.get_meta(resource_type)
+                                      for resource_type in resource_types]))
+
+        if columns:
+            rows = zip(*[values for key, values in columns])
+        else:
+            rows = [() for obj in present_objs]
+
+        if len(present_objs) != len(objs):
+            rows = iter(rows)
+            rows = [next(rows) if obj else None for obj in objs]
+
+        return ResourceRows(column_keys, rows, meta)
+
+    def get_columns(self, objs, verbose=False, fields=None, prefetches=None, native=False):
+        """
+        Output each field for a list of objects
+        :param objs: A list of objects - falsy objects are not allowed
+        :param prefetches: The result of prefetch_async for objs if already started
+        :returns: A list of (key, list of values in order of objs) tuples in rules order
+        """
+
+        return self._get_columns(objs, self.get_objs_selection(objs, verbose, fields, native),
+                                 prefetches)
+
+    def _get_columns(self, objs, selection, prefetches=None):
+        for obj in objs:
+            if not isinstance(obj, VALID_RESORCE_TYPES):
+                err = 'ResourceSerializer requires instances of %s or None. Received %s, %s.'
+                raise TypeError(err % (VALID_RESORCE_TYPES, type(obj), obj))
+
+        profiler = rest_profiler.active_profiler
+        if profiler is None:
+            return self._get_column_values(objs, selection.multi_getters, selection, prefetches)
+
+        # Profile each resource type of a mixed list under its own name
+        resource_types = []
+        positions = {}
+        for i, obj in enumerate(objs):
+            resource_type = get_resource_type(obj)
+            if resource_type not in positions:
+                resource_types.append(resource_type)
+                positions[resource_type] = []
+            positions[resource_type].append(i)
+
+        if len(resource_types) == 1:
+            multi_getters = profiler.wrap_getters(selection.multi_getters, resource_types[0],
+                                                  _get_values, multi=True)
+            return self._get_column_values(objs, multi_getters, selection, prefetches)
+
+        columns = [(key, [None] * len(objs)) for key, getter in selection.multi_getters]
+        for resource_type in resource_types:
+            multi_getters = profiler.wrap_getters(selection.multi_getters, resource_type,
+                                                  _get_values, multi=True)
+            group_objs = [objs[i] for i in positions[resource_type]]
+
+            # Each group prefetches its own objects
+            group_columns = self._get_column_values(group_objs, multi_getters, selection)
+            for (key, values), (_, group_values) in zip(columns, group_columns):
+                for i, value in zip(positions[resource_type], group_values):
+                    values[i] = value
+        return columns
+
+    def _get_column_values(self, objs, multi_getters, selection, prefetches=None):
+        # Kick off all batched fetches before any field waits on its own
+        if prefetches is None:
+            prefetches = self._prefetch_async(objs, selection)
+
+        columns = []
+        for key, getter in multi_getters:
+            if getter is None:
+                values = _get_values(objs, key)
+            elif key in prefetches:
+                values = getter(objs, key, prefetch=prefetches[key])
+            else:
+                values = getter(objs, key)
+
+            columns.append((key, values))
+        return columns
+
+    @ndb.tasklet
+    def to_list_async(self, objs, verbose=False, fields=None, rows=False, native=False):
+        """
+        Tasklet version of to_list - yields to other tasklets while its fields' batched fetches
+        are pending, so they overlap with other datastore work of the request
+        Referenced resources' own nested fetches are still waited on in turn.
+        :param rows: Output a ResourceRows - see to_rows
+        """
+
+        objs = list(objs)
+        prefetches = self.prefetch_async(objs, verbose=verbose, fields=fields, native=native)
+
+        futures = []
+        for prefetch in prefetches.values():
+            if hasattr(prefetch, 'get_futures'):
+                futures.extend(prefetch.get_futures())
+
+        if futures:
+            yield futures
+
+        if rows:
+            raise ndb.Return(self.to_rows(objs, verbose=verbose, fields=fields,
+                                          prefetches=prefetches, native=native))
+        raise ndb.Return(self.to_list(objs, verbose=verbose, fields=fields, prefetches=prefetches,
+                                      native=native))
+
+
+class ResourceRows(object):
+    """
+    A list of resources in columnar form - see ResourceSerializer.to_rows
+    """
+
+    def __init__(self, columns, rows, meta):
+        """
+        :param columns: The list of field keys, in rules order
+        :param rows: A list of value tuples in column order (or None for an empty resource)
+        :param meta: The _meta of the rows, or None if each row has its own in a '_meta' column
+        """
+
+        self.columns = columns
+        self.rows = rows
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class FieldSelection(object):
+    """
+    The compiled subset of a rules list to output - see ResourceSerializer.get_selection
+    """
+
+    def __init__(self, fields, is_verbose, omitted_fields=None, subfields=None, native=False):
+        """
+        :param fields: The list of RestFields to output
+        :param is_verbose: Reported in _meta
+        :param omitted_fields: Keys left out by a requested fields list, reported in _meta
+        :param subfields: A dict of key to requested sub field paths for ResourceFields
+        :param native: Output raw values for fields with native_output, including those of
+            ResourceFields' resources
+        """
+
+        subfields = subfields or {}
+
+        self.fields = fields
+        self.is_verbose = is_verbose
+        self.omitted_fields = omitted_fields
+        self.subfields = subfields
+        self.native = native
+        self.projections = {}  # Compiled projections by model class - see get_projection
+        self.projected_selections = {}  # Narrowed selections - see get_projected
+
+        # Lists of (key, getter) pairs. Getter is None when the field uses the default
+        # RestField.from_resource so the lookup can be inlined.
+        self.getters = []
+        self.multi_getters = []
+
+        # List of (key, field) pairs for fields that batch fetch data ahead of output
+        self.prefetchers = []
+
+        for field in fields:
+            key = field.key
+
+            if native and field.native_output:
+                self.getters.append((key, None))
+                self.multi_getters.append((key, None))
+                continue
+
+            if getattr(field.from_resource, 'im_func', None) is _default_from_resource:
+                self.getters.append((key, None))
+                self.multi_getters.append((key, None))
+                continue
+
+            # A field's from_resource_multi is only used if it is defined at or below the class
+            # that defines its from_resource
+            klass = type(field)
+            if not issubclass(_defining_class(klass, 'from_resource_multi'),
+                              _defining_class(klass, 'from_resource')):
+                self.getters.append((key, field.from_resource))
+                self.multi_getters.append((key, partial(RestField.from_resource_multi, field)))
+                continue
+
+            if _defining_class(klass, 'prefetch_async') is not RestField:
+                self.prefetchers.append((key, field))
+
+            if isinstance(field, ResourceField) and (key in subfields or native):
+                multi_getter = partial(field.from_resource_multi, fields=subfields.get(key),
+                                       native=native)
+                self.getters.append((key, _single_getter(multi_getter)))
+                self.multi_getters.append((key, multi_getter))
+            else:
+                self.getters.append((key, field.from_resource))
+                self.multi_getters.append((key, field.from_resource_multi))
+
+    def compile_projection(self, model_class):
+        """
+        Collect the projected property names of each field - see ResourceSerializer.get_projection
+        """
+
+        projection = []
 
         for field in self.fields:
-            if not field.output_only:  # or allowed...
-                allowed_input_field_keys.append(field.key)
+            prop_names = field.get_projection(model_class)
+            if prop_names is None:
+                return None
+
+            for prop_name in prop_names:
+                if prop_name not in projection:
+                    projection.append(prop_name)
+
+        # ndb projections need at least one property
+        return projection or None
+
+    def get_projected(self, model_class, projection):
+        """
+        Get this selection narrowed to the fields that entities of model_class fetched with a
+        projection can output. Fields reading a property left out of the projection are omitted
+        (and listed in _meta.omitted_fields) rather than output as None.
+        :param projection: The entities' _projection - a tuple of property names
+        """
+
+        selection = self.projected_selections.get((model_class, projection))
+        if selection is None:
+            projected = set(projection)
+            fields = []
+            omitted_fields = list(self.omitted_fields or [])
+
+            for field in self.fields:
+                prop_names = field.get_projection(model_class)
+                if prop_names is not None and projected.issuperset(prop_names):
+                    fields.append(field)
+                else:
+                    omitted_fields.append(field.key)
+
+            selection = self
+            if len(fields) != len(self.fields):
+                selection = FieldSelection(fields, is_verbose=False, omitted_fields=omitted_fields,
+                                           subfields=self.subfields, native=self.native)
+
+            if len(self.projected_selections) >= MAX_COMPILED_RULES:
+                self.projected_selections.clear()
+            self.projected_selections[(model_class, projection)] = selection
+        return selection
+
+    def get_meta(self, resource_type):
+        """
+        Build the _meta dict for an output resource
+        """
+
+        meta = {'is_verbose': self.is_verbose, 'resource_type': resource_type}
+        if self.omitted_fields is not None:
+            meta['omitted_fields'] = self.omitted_fields
+        return meta
+
+
+def _single_getter(multi_getter):
+    """
+    Wrap a from_resource_multi style getter to output a single object
+    """
+
+    def getter(obj, field):
+        return multi_getter([obj], field)[0]
+    return getter
 
-            if field.required:
-                required_input_field_keys.append(field.key)
 
-        allowed_input_field_keys = set(allowed_input_field_keys)
-        required_input_field_keys = set(required_input_field_keys)
+class ValidationPlan(object):
+    """
+    A rules list compiled for input - build once and reuse for every payload
+
+    Resolves the allowed and required key sets, the input fields and each field's voluptuous
+    schema up front. Use get_validation_plan(fields) to share plans across requests.
+    """
+
+    def __init__(self, fields):
+        if not (isinstance(fields, list)):
+            err = 'ValidationPlan requires list. Received %s, %s.'
+            raise TypeError(err % (type(fields), fields))
+
+        self.fields = fields
+        self.input_fields = [field for field in fields if not field.output_only]  # or allowed...
+        self.allowed_keys = set([field.key for field in self.input_fields])
+        self.required_keys = set([field.key for field in fields if field.required])
+
+        for field in self.input_fields:
+            field.get_schema()
+
+    def clean(self, data, resource_type=DEFAULT_RESOURCE_TYPE):
+        """
+        Validate a dictionary of input values - see Resource.from_dict
+        :param resource_type: What the input is profiled under when a profiler is active
+        :returns: A dict of cleaned values
+        """
+
+        cleaned_data = {}
 
+        # First validate that all input keys are allowed input fields
         given_field_keys = set(data.keys())
 
-        for key in given_field_keys.difference(allowed_input_field_keys):
+        for key in given_field_keys.difference(self.allowed_keys):
             # TODO: Collect these and present them as a single error dict
             raise UnknownFieldError('key "%s" is not an allowed input field for a resource.' % key)
 
         # Next validate that required keys are not abscent
-        for key in required_input_field_keys.difference(given_field_keys):
+        for key in self.required_keys.difference(given_field_keys):
             # TODO: Collect these and present them as a single error dict
             raise RequiredFieldError('key "%s" is a required input field for a resource.' % key)
 
         # Next Validate the various properties
-        for field in self.fields:
-            if (not field.output_only) and field.key in data:
-                value = field.to_resource(data)
-                self.cleaned_data[field.key] = value
+        profiler = rest_profiler.active_profiler
+        if profiler is None:
+            for field in self.input_fields:
+                if field.key in data:
+                    cleaned_data[field.key] = field.to_resource(data)
+        else:
+            for field in self.input_fields:
+                if field.key in data:
+                    cleaned_data[field.key] = profiler.call(
+                        resource_type, field.key, 'to_resource', field.to_resource, data)
 
-        return self.cleaned_data
+        return cleaned_data
 
-    def to_dict(self, verbose=False):
+    def clean_many(self, items, resource_type=DEFAULT_RESOURCE_TYPE):
         """
-        Dumps a rest Resource to a dictionary of values
+        Validate a list of input dictionaries, collecting errors rather than stopping at the first
+        :param resource_type: What the input is profiled under - see clean
+        :returns: A tuple of (list of cleaned dicts, list of {'index': int, 'message': str} errors)
         """
 
-        result = {}
+        cleaned_items = []
+        errors = []
 
-        obj = self.obj
-        if not obj:
-            return result
+        for i, data in enumerate(items):
+            if not isinstance(data, dict):
+                errors.append({'index': i, 'message': 'Item must be an object.'})
+                continue
 
-        # Keep track of if we excluded anything because of verbose, etc
-        has_excluded_props = False
+            try:
+                cleaned_items.append(self.clean(data, resource_type=resource_type))
+            except INPUT_ERRORS, e:
+                errors.append({'index': i, 'message': unicode(e)})
 
-        for field in self.fields:
-            if not field.verbose_only or verbose:
-                result[field.key] = field.from_resource(obj, field.key)
-            else:
-                has_excluded_props = True
+        return cleaned_items, errors
 
-        result['_meta'] = {'is_verbose': not has_excluded_props,
-                           'resource_type': self.resource_type}
-        return result
+
+_compiled_serializers = {}
+_compiled_validation_plans = {}
+
+
+def _get_compiled(cache, fields, compiler):
+    """
+    Get a compiled form of a rules list from cache, compiling it on first use
+    """
+
+    entry = cache.get(id(fields))
+    if entry is None or entry[0] is not fields:
+        if len(cache) >= MAX_COMPILED_RULES:
+            cache.clear()  # Rules are being built per request; don't grow forever
+
+        entry = (fields, compiler(fields))
+        cache[id(fields)] = entry
+    return entry[1]
+
+
+def get_serializer(fields):
+    """
+    Get the compiled ResourceSerializer for a rules list, compiling it on first use
+
+    Serializers are cached by rules list identity, so define rules lists once (i.e. at module
+    level) and do not mutate them after first use.
+    """
+
+    entry = _compiled_serializers.get(id(fields))
+    if entry is not None and entry[0] is fields:
+        return entry[1]  # Inlined _get_compiled hit - this is on every Resource.to_dict
+    return _get_compiled(_compiled_serializers, fields, ResourceSerializer)
+
+
+def get_validation_plan(fields):
+    """
+    Get the compiled ValidationPlan for a rules list, compiling it on first use
+    Cached by rules list identity - see get_serializer.
+    """
+
+    return _get_compiled(_compiled_validation_plans, fields, ValidationPlan)
+
+
+def _defining_class(klass, name):
+    """
+    Find the class in klass's mro that defines the attribute name
+    """
+
+    for base in klass.__mro__:
+        if name in base.__dict__:
+            return base
+    return object
+
+
+def _get_values(objs, field):
+    """
+    Fetch the raw values of a property for a list of objects - RestField.from_resource in bulk
+    """
+
+    if all(isinstance(obj, dict) for obj in objs):
+        return [obj.get(field, None) for obj in objs]
+
+    try:
+        return [obj.get(field, None) if isinstance(obj, dict) else getattr(obj, field, None)
+                for obj in objs]
+    except ndb.UnprojectedPropertyError:
+        return [obj.get(field, None) if isinstance(obj, dict) else _get_attr(obj, field)
+                for obj in objs]
+
+
+def _get_attr(obj, field):
+    """
+    Fetch the raw value of a property, outputting None for properties left out of a projection
+    """
+
+    try:
+        return getattr(obj, field, None)
+    except ndb.UnprojectedPropertyError:
+        return None
+
+
+def get_projection(model_class, rules, verbose=False, fields=None):
+    """
+    Get the datastore property names needed to output entities of model_class with rules
+    Pass the result as the projection of an ndb query to only load what is output, i.e.
+    `query.fetch(limit, projection=get_projection(Post, RULES))`. Only fields that read an indexed,
+    non repeated property (or the key) can be projected.
+    :param fields: Optional list of keys to restrict output to - see get_selection
+    :returns: A list of property names or None if the output needs full entities
+    """
+
+    return get_serializer(rules).get_projection(model_class, verbose=verbose, fields=fields)
+
+
+def get_model_property(model_class, name):
+    """
+    Find the ndb Property of model_class by datastore name or attribute name
+    """
+
+    prop = model_class._properties.get(name)
+    if prop is None:
+        prop = getattr(model_class, name, None)
+
+    if isinstance(prop, ndb.model.Property):
+        return prop
+    return None
+
+
+def is_projectable(prop):
+    """
+    Determine if an ndb Property can be loaded via a projection query
+    """
+
+    return (prop._indexed and not prop._repeated and
+            not isinstance(prop, (ndb.StructuredProperty, ndb.LocalStructuredProperty)))
+
+
+def get_resource_type(obj):
+    """
+    Determine the resource type to report in _meta for a given object
+    """
+
+    if (obj and isinstance(obj, Model)):
+        return obj.get_kind()
+    elif (obj and isinstance(obj, ndb.Model)):
+        return obj.key.kind()
+    return DEFAULT_RESOURCE_TYPE
 
 
 class RestField(object):
@@ -163,6 +913,8 @@ class RestField(object):
     Baseclass for a specific field for a Rest Resource.
     """
 
+    native_output = False  # Output the raw value for codecs with native types - see get_selection
+
     def __init__(self, prop, verbose_only=False, always=True, validator=None, output_only=False,
                  input_only=False, required=False):
 
@@ -176,6 +928,7 @@ class RestField(object):
         self.input_only = input_only
         self.output_only = output_only
         self.required = required  # Required on input
+        self._schema = None  # Compiled validator - see get_schema
 
         if isinstance(self.prop, ndb.model.Property):
             self.key = self.key or self.prop._name
@@ -196,12 +949,21 @@ class RestField(object):
 
         if self.validator:
             try:
-                value = voluptuous.Schema(self.validator, required=self.required)(value)
+                value = self.get_schema()(value)
             except Exception, e:
                 raise RestValueException(self, value, e)
 
         return value
 
+    def get_schema(self):
+        """
+        Get the compiled voluptuous Schema for the validator, compiling it on first use
+        """
+
+        if self._schema is None and self.validator:
+            self._schema = voluptuous.Schema(self.validator, required=self.required)
+        return self._schema
+
     def from_resource(self, obj, field):
         """
         Default handler for properties
@@ -213,7 +975,35 @@ class RestField(object):
 
         if isinstance(obj, dict):
             return obj.get(field, None)
-        return getattr(obj, field, None)
+        return _get_attr(obj, field)
+
+    def from_resource_multi(self, objs, field):
+        """
+        Handler for outputting a field for many objects at once - see ResourceList
+        Override this to batch work across objects. Returns a list of values in order of objs.
+        """
+
+        return [self.from_resource(obj, field) for obj in objs]
+
+    def prefetch_async(self, objs):
+        """
+        Start any batched fetches needed to output this field for objs
+        Override this along with from_resource_multi, which receives the result as `prefetch`.
+        """
+
+        return None
+
+    def get_projection(self, model_class):
+        """
+        Get the datastore property names this field reads from entities of model_class
+        Override this if from_resource reads something other than the property named by key.
+        :returns: A list of property names or None if the field needs the full entity
+        """
+
+        prop = get_model_property(model_class, self.key)
+        if prop is None or not is_projectable(prop):
+            return None
+        return [prop._name]
 
     def to_resource(self, data):
         """
@@ -241,6 +1031,10 @@ class RestField(object):
         return value
 
 
+_default_from_resource = RestField.from_resource.im_func  # Inlined by ResourceSerializer
+_default_getter = partial(_default_from_resource, None)  # Stands in for inlined getters
+
+
 class ResourceUrlField(RestField):
     """
     Field to populate the endpoint url to get the full resource
@@ -261,6 +1055,13 @@ class ResourceUrlField(RestField):
         else:
             return 'unknown object'
 
+    def get_projection(self, model_class):
+        """
+        No datastore properties are read - the id is not affected by projections
+        """
+
+        return []
+
 
 class ResourceIdField(RestField):
     """
@@ -281,17 +1082,41 @@ class ResourceIdField(RestField):
         if (obj and isinstance(obj, Model)):
             return obj.id
 
+    def get_projection(self, model_class):
+        """
+        No datastore properties are read - the id is not affected by projections
+        """
+
+        return []
+
 
 class ResourceField(RestField):
     """
     Resource Field - similar to a Reference Property
+
+    Referenced entities may be attached to the object already (as the attribute `prop`), otherwise
+    they are fetched via `loader` - a callable that takes a list of unique resource ids and returns
+    a list (or a future of a list) of entities or futures in the same order.
+    Defaults to get_resources_async which uses ndb.get_multi_async.
     """
 
-    def __init__(self, prop, resource_id_prop, resource_rules, **kwargs):
+    def __init__(self, prop, resource_id_prop, resource_rules, loader=None, **kwargs):
         self.resource_id_prop = resource_id_prop
         self.resource_rules = resource_rules
+        self.loader = loader or get_resources_async
         super(ResourceField, self).__init__(prop, **kwargs)
 
+    def _get_attached(self, obj):
+        """
+        Return a tuple of (is_attached, entity) for an already dereferenced entity on obj
+        """
+
+        if isinstance(obj, dict):
+            return (self.key in obj, obj.get(self.key, None))
+        if hasattr(obj, self.key):
+            return (True, getattr(obj, self.key, None))
+        return (False, None)
+
     def from_resource(self, obj, field):
         """
         Resolve a REST resource from an entity
@@ -303,17 +1128,139 @@ class ResourceField(RestField):
             return None
 
         # Resolve Entity
-        resource_entity = None
-        if hasattr(obj, self.key):
-            resource_entity = getattr(obj, self.key, None)
-        else:
-            logging.error('Reference prop `%s` was not bulk dereferenced.' % self.key)
-            logging.error('Failed to convert resource id %s to a key for prop %s.' % vars)
-            logging.error(obj)
-            return None
+        is_attached, resource_entity = self._get_attached(obj)
+        if not is_attached:
+            resource_entity = self.prefetch_async([obj]).get_result().get(resource_id)
 
         return Resource(resource_entity, self.resource_rules).to_dict()
 
+    def get_projection(self, model_class):
+        """
+        Only the resource id property is read - the referenced entity is fetched separately
+        """
+
+        prop = get_model_property(model_class, self.resource_id_prop)
+        if prop is None or not is_projectable(prop):
+            return None
+        return [prop._name]
+
+    def prefetch_async(self, objs):
+        """
+        Start a single batched fetch of the referenced entities not already attached to objs
+        :returns: A ResourcePrefetch
+        """
+
+        resource_ids = []
+        seen = set()
+
+        for obj, resource_id in zip(objs, _get_values(objs, self.resource_id_prop)):
+            if not resource_id or resource_id in seen or self._get_attached(obj)[0]:
+                continue
+
+            seen.add(resource_id)
+            resource_ids.append(resource_id)
+
+        if not resource_ids:
+            return ResourcePrefetch([], [])
+
+        return ResourcePrefetch(resource_ids, self.loader(resource_ids))
+
+    def from_resource_multi(self, objs, field, prefetch=None, fields=None, native=False):
+        """
+        Resolve REST resources for many entities, serializing the referenced entities together
+        :param prefetch: A ResourcePrefetch previously started for objs, if any
+        :param fields: Optional list of keys of resource_rules to restrict output to
+        :param native: Output the resources' native values - see get_selection
+        """
+
+        if prefetch is None:
+            prefetch = self.prefetch_async(objs)
+
+        resource_ids = _get_values(objs, self.resource_id_prop)
+        loaded_entities = prefetch.get_result()
+
+        results = [None] * len(objs)
+        positions = []
+        resource_entities = []
+
+        for i, (obj, resource_id) in enumerate(zip(objs, resource_ids)):
+            if not resource_id:
+                continue
+
+            is_attached, resource_entity = self._get_attached(obj)
+            if not is_attached:
+                resource_entity = loaded_entities.get(resource_id)
+
+            positions.append(i)
+            resource_entities.append(resource_entity)
+
+        serializer = get_serializer(self.resource_rules)
+        resources = serializer.to_list(resource_entities, fields=fields, native=native)
+        for i, result in zip(positions, resources):
+            results[i] = result
+
+        return results
+
+
+class ResourcePrefetch(object):
+    """
+    A pending batched fetch of referenced resources - see ResourceField.prefetch_async
+    """
+
+    def __init__(self, resource_ids, results):
+        """
+        :param resource_ids: A list of unique resource ids
+        :param results: What the loader returned for resource_ids
+        """
+
+        self.resource_ids = resource_ids
+        self.results = results
+        self._entities = None
+
+    def get_futures(self):
+        """
+        Get the pending ndb Futures of the fetch - for tasklets to yield on
+        """
+
+        if isinstance(self.results, ndb.Future):
+            return [self.results]
+        return [result for result in self.results if isinstance(result, ndb.Future)]
+
+    def get_result(self):
+        """
+        Wait on the fetch
+        :returns: A dict of resource id to entity (or None if it does not exist)
+        """
+
+        if self._entities is None:
+            results = _get_result(self.results)
+            self._entities = dict(zip(self.resource_ids, [_get_result(r) for r in results]))
+        return self._entities
+
+
+def get_resources_async(resource_ids):
+    """
+    Default ResourceField loader - fetch entities by ndb.Key or urlsafe key str in one batch
+    """
+
+    keys = []
+    for resource_id in resource_ids:
+        if not isinstance(resource_id, ndb.Key):
+            resource_id = ndb.Key(urlsafe=resource_id)
+        keys.append(resource_id)
+
+    return ndb.get_multi_async(keys)
+
+
+def _get_result(result):
+    """
+    Resolve a value that may be an ndb.Future
+    """
+
+    if isinstance(result, ndb.Future):
+        return result.get_result()
+    return result
+
 
 class UploadField(RestField):
     """
@@ -409,6 +1356,8 @@ class GeoField(RestField):
     Field to support a Geo coordinate property
     """
 
+    native_output = True
+
     def __init__(self, prop, **kwargs):
         super(GeoField, self).__init__(prop, **kwargs)
 
@@ -418,9 +1367,12 @@ class GeoField(RestField):
         # Could be a single dict or a list of dicts
 
         if val:
-            if (isinstance(val, list)):
-                return [ndb.GeoPt(lat=pt['lat'], lon=pt['lon']) for pt in val]
-            return ndb.GeoPt(lat=val['lat'], lon=val['lon'])
+            try:
+                if (isinstance(val, list)):
+                    return [_to_geo_pt(pt) for pt in val]
+                return _to_geo_pt(val)
+            except (KeyError, TypeError, datastore_errors.BadValueError), e:
+                raise RestValueException(self, val, e)
         return None
 
     def from_resource(self, obj, field):
@@ -435,6 +1387,24 @@ class GeoField(RestField):
 
         return [{'lat': pt.lat, 'lon': pt.lon} for pt in val]
 
+    def from_resource_multi(self, objs, field):
+        """
+        Output geo points to dict vals for many objects
+        """
+
+        return [[{'lat': pt.lat, 'lon': pt.lon} for pt in val] if val else None
+                for val in _get_values(objs, field)]
+
+
+def _to_geo_pt(val):
+    """
+    Convert an input {'lat': ..., 'lon': ...} dict to a GeoPt - binary codecs decode GeoPts natively
+    """
+
+    if isinstance(val, ndb.GeoPt):
+        return val
+    return ndb.GeoPt(lat=val['lat'], lon=val['lon'])
+
 
 class SlugField(RestField):
     """
@@ -452,6 +1422,8 @@ class DatetimeField(RestField):
     Field to support a Geo coordinate property
     """
 
+    native_output = True
+
     def __init__(self, prop, **kwargs):
         super(DatetimeField, self).__init__(prop, **kwargs)
 
@@ -460,7 +1432,10 @@ class DatetimeField(RestField):
 
         if val:
             # Make a datetime
-            return coerce_to_datetime(val)
+            try:
+                return coerce_to_datetime(val)
+            except (ValueError, TypeError), e:
+                raise RestValueException(self, val, e)
         return None
 
     def from_resource(self, obj, field):
@@ -475,3 +1450,10 @@ class DatetimeField(RestField):
 
         # Make a String from datetime
         return coerce_from_datetime(val)
+
+    def from_resource_multi(self, objs, field):
+        """
+        Output datetimes to str vals for many objects
+        """
+
+        return coerce_from_datetimes(_get_values(objs, field))
@@ -0,0 +1,176 @@
+"""
+Per-phase request timing - reported in a Server-Timing header and/or to a stats sink
+
+Enable the header with REST_SERVER_TIMING_ENABLED and set REST_STATS_SINK to a dotted path to a
+stats sink class (see MemoryStatsSink) in rest_core_settings. When both are off, requests use
+NULL_TIMER and timing costs nothing.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from constants import API_SERVER_TIMING_ENABLED, API_STATS_SINK
+import utils as rest_utils
+
+
+class RequestTimer(object):
+    """
+    Cumulative seconds spent in each named phase of a request, in the order phases first ran
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.timings = OrderedDict()
+        self.start = time.time()
+
+    def phase(self, name):
+        """
+        Time a block, i.e. `with timer.phase('decode'): ...`
+        """
+
+        return TimedPhase(self, name)
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def add_middleware(self, func_name, timings):
+        """
+        Add the timings of a MiddlewarePipeline run as one phase per middleware class
+        :param timings: A list of (middleware path, seconds) tuples
+        """
+
+        for path, seconds in timings:
+            self.add('%s.%s' % (path.rsplit('.', 1)[-1], func_name), seconds)
+
+    def get_elapsed(self):
+        return time.time() - self.start
+
+    def get_header(self):
+        """
+        Format the timings as a Server-Timing header value with durations in milliseconds
+        """
+
+        return ', '.join('%s;dur=%.2f' % (name, seconds * 1000)
+                         for name, seconds in self.timings.iteritems())
+
+
+class TimedPhase(object):
+    """
+    Context manager adding the time spent in a block to a RequestTimer
+    """
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.timer.add(self.name, time.time() - self.start)
+
+
+class NullTimer(object):
+    """
+    A RequestTimer that records nothing - used when timing is disabled
+    """
+
+    enabled = False
+    timings = OrderedDict()
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def add(self, name, seconds):
+        pass
+
+    def add_middleware(self, func_name, timings):
+        pass
+
+
+class NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+
+NULL_TIMER = NullTimer()
+NULL_PHASE = NullPhase()
+
+
+def get_timer():
+    """
+    Get a timer for a new request - NULL_TIMER unless the header or a stats sink is enabled
+    """
+
+    if API_SERVER_TIMING_ENABLED or get_stats_sink():
+        return RequestTimer()
+    return NULL_TIMER
+
+
+class LoggingStatsSink(object):
+    """
+    Log the phase timings of every request
+    """
+
+    def record(self, handler_name, method, status, timings):
+        """
+        :param timings: A list of (phase name, seconds) tuples
+        """
+
+        logging.info('%s %s %s %s', handler_name, method, status,
+                     ' '.join('%s=%.2fms' % (name, seconds * 1000) for name, seconds in timings))
+
+
+class MemoryStatsSink(object):
+    """
+    Keep cumulative phase timings per handler in process - see get_stats
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, handler_name, method, status, timings):
+        """
+        :param timings: A list of (phase name, seconds) tuples
+        """
+
+        with self.lock:
+            for name, seconds in timings:
+                stat = self.stats.setdefault((handler_name, method, name), [0, 0.0])
+                stat[0] += 1
+                stat[1] += seconds
+
+    def get_stats(self):
+        """
+        Get cumulative timings, slowest first
+        :returns: A list of (handler name, method, phase name, calls, total seconds) tuples
+        """
+
+        with self.lock:
+            stats = [(handler_name, method, name, calls, seconds)
+                     for (handler_name, method, name), (calls, seconds) in self.stats.items()]
+        return sorted(stats, key=lambda stat: stat[4], reverse=True)
+
+
+_stats_sink = None
+
+
+def get_stats_sink():
+    """
+    Get the configured stats sink, building it on first use. None if not configured.
+    """
+
+    global _stats_sink
+
+    if _stats_sink is None and API_STATS_SINK:
+        _stats_sink = rest_utils.path_to_reference(API_STATS_SINK)()
+    return _stats_sink
@@ -3,7 +3,11 @@
 import re
 import hashlib
 import json
-from constants import API_WHITELIST_DOMAINS, API_WHITELIST_RULES
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from constants import API_WHITELIST_DOMAINS, API_WHITELIST_RULES, API_CORS_CACHE_SIZE
 
 import rest_core_settings as settings
 
@@ -12,29 +16,110 @@ SEPARATOR = chr(30)
 INTPREFIX = chr(31)
 
 
-def is_origin_in_whitelist(domain):
+class LRUCache(object):
+    """
+    A bounded, thread safe, least recently used cache
     """
-    Check if a given domain (starting with protocol) is in our white list
-    :param domain: A `str` of protocol://domain
 
-    TODO: Make this more generic for when this is a pip installable library
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+
+            self.data[key] = value  # Mark as most recently used
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+
+            if len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+
+class OriginMatcher(object):
+    """
+    Compiled origin whitelist - a set of exact domains plus one combined regex of rules
+    Recent decisions are kept in a bounded LRU cache.
     """
 
-    if not domain:
-        return False
+    def __init__(self, domains, rules, cache_size=1000):
+        """
+        :param domains: A list of `str` protocol://domain to match exactly
+        :param rules: A list of regex `str` to match from the start of the origin
+        """
+
+        self.domains = frozenset(domains)
+        self.pattern = None
+        if rules:
+            self.pattern = re.compile('|'.join(['(?:%s)' % rule for rule in rules]))
+
+        self.cache = LRUCache(max_size=cache_size)
 
-    # Check against explicit list
-    if domain in API_WHITELIST_DOMAINS:
-        return True
+    def match(self, domain):
+        """
+        Check if a given domain (starting with protocol) is whitelisted
+        """
 
-    # Check against rules
-    for rule in API_WHITELIST_RULES:
-        matches = re.match(rule, domain)
+        if not domain:
+            return False
 
-        if matches:
+        # Check against explicit list
+        if domain in self.domains:
             return True
 
-    return False
+        result = self.cache.get(domain)
+        if result is None:
+            # Check against rules
+            result = bool(self.pattern and self.pattern.match(domain))
+            self.cache.set(domain, result)
+        return result
+
+
+_origin_matcher = None
+
+
+def get_origin_matcher():
+    """
+    Get the OriginMatcher for the configured whitelist, building it on first use
+    """
+
+    global _origin_matcher
+
+    if _origin_matcher is None:
+        _origin_matcher = OriginMatcher(API_WHITELIST_DOMAINS, API_WHITELIST_RULES,
+                                        cache_size=API_CORS_CACHE_SIZE)
+    return _origin_matcher
+
+
+def is_origin_in_whitelist(domain):
+    """
+    Check if a given domain (starting with protocol) is in our white list
+    :param domain: A `str` of protocol://domain
+
+    TODO: Make this more generic for when this is a pip installable library
+    """
+
+    return get_origin_matcher().match(domain)
 
 
 def create_request_key(prefix, params_dict):
@@ -68,6 +153,74 @@ def create_request_key(prefix, params_dict):
     return cache_stamp
 
 
+COMPRESSION_ENCODINGS = ['gzip', 'deflate']  # Preferred first
+
+
+def choose_content_encoding(accept_encoding):
+    """
+    Pick a supported compression from an Accept-Encoding header
+    :param accept_encoding: A `str` Accept-Encoding header value or None
+    :returns: 'gzip', 'deflate' or None
+    """
+
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for part in accept_encoding.split(','):
+        bits = part.strip().split(';')
+        coding = bits[0].strip().lower()
+        quality = 1.0
+
+        for param in bits[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        qualities[coding] = quality
+
+    for coding in COMPRESSION_ENCODINGS:
+        if qualities.get(coding, qualities.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def _compressobj(encoding, level):
+    wbits = zlib.MAX_WBITS
+    if encoding == 'gzip':
+        wbits += 16  # gzip header and trailer
+    return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+
+def compress(output, encoding, level=6):
+    """
+    Compress a `str` with the given content encoding
+    """
+
+    compressor = _compressobj(encoding, level)
+    return compressor.compress(output) + compressor.flush()
+
+
+def compress_iter(chunks, encoding, level=6):
+    """
+    Generator to compress an iterable of `str` chunks incrementally
+    """
+
+    compressor = _compressobj(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
 def path_to_reference(path):
     """
     Convert an object path reference to a reference.
@@ -111,18 +264,102 @@ def path_to_reference(path):
             'Unable to find function "%s".' % (path,))
 
 
+class MiddlewarePipeline(object):
+    """
+    Middleware classes resolved once into lists of hooks
+    Also keeps cumulative per middleware hook timing - see get_stats
+    """
+
+    def __init__(self, middleware_paths):
+        """
+        :param middleware_paths: A list of dotted paths to middleware classes
+        """
+
+        self.middleware_paths = tuple(middleware_paths or [])
+        self.middleware = [(path, path_to_reference(path)) for path in self.middleware_paths]
+
+        self.hooks = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get_hooks(self, func_name):
+        """
+        Get the list of (middleware path, hook) pairs for a hook name, resolving it on first use
+        """
+
+        hooks = self.hooks.get(func_name)
+        if hooks is None:
+            hooks = [(path, getattr(klass, func_name)) for path, klass in self.middleware
+                     if hasattr(klass, func_name)]
+            self.hooks[func_name] = hooks
+        return hooks
+
+    def run(self, func_name, request):
+        """
+        Call a hook on every middleware that defines it
+        :returns: A list of (middleware path, seconds) tuples for this run
+        """
+
+        timings = []
+        for path, hook in self.get_hooks(func_name):
+            start = time.time()
+            hook(request)
+            timings.append((path, time.time() - start))
+
+        if timings:
+            self.record(func_name, timings)
+        return timings
+
+    def record(self, func_name, timings):
+        """
+        Add a run's timings to the cumulative stats
+        """
+
+        with self.lock:
+            for path, seconds in timings:
+                stat = self.stats.setdefault((path, func_name), [0, 0.0])
+                stat[0] += 1
+                stat[1] += seconds
+
+    def get_stats(self):
+        """
+        Get cumulative timings, slowest first
+        :returns: A list of (middleware path, hook name, calls, total seconds) tuples
+        """
+
+        with self.lock:
+            stats = [(path, func_name, calls, seconds)
+                     for (path, func_name), (calls, seconds) in self.stats.items()]
+        return sorted(stats, key=lambda stat: stat[3], reverse=True)
+
+
+_middleware_pipeline = None
+
+
+def get_middleware_pipeline():
+    """
+    Get the MiddlewarePipeline for REST_MIDDLEWARE_CLASSES, building it on first use
+    """
+
+    global _middleware_pipeline
+
+    middleware_paths = tuple(getattr(settings, 'REST_MIDDLEWARE_CLASSES', None) or [])
+
+    pipeline = _middleware_pipeline
+    if pipeline is None or pipeline.middleware_paths != middleware_paths:
+        pipeline = MiddlewarePipeline(middleware_paths)
+        _middleware_pipeline = pipeline
+    return pipeline
+
+
 def apply_middleware(request, func_name):
     """
-    Given a callback hook funcname,
-    #TODO: This should cache the imports
+    Given a callback hook funcname, call it on every middleware class
+    Note: This resolves the classes on every call - prefer get_middleware_pipeline().run
     """
 
     if not (hasattr(settings, 'REST_MIDDLEWARE_CLASSES') and settings.REST_MIDDLEWARE_CLASSES):
         return
 
-    for middleware_path in settings.REST_MIDDLEWARE_CLASSES:
-        klass = path_to_reference(middleware_path)
-        if hasattr(klass, func_name):
-            getattr(klass, func_name)(request)
-
+    MiddlewarePipeline(settings.REST_MIDDLEWARE_CLASSES).run(func_name, request)
     return True
@@ -0,0 +1,119 @@
+"""
+Tests for the batch request handler
+"""
+
+import json
+import mock
+import threading
+import voluptuous
+import webapp2
+from tests import BaseCase
+import batch
+import handlers
+import resources
+
+
+RULES = [resources.RestField('name', required=True)]
+
+
+class ThingsHandler(handlers.RestHandlerBase):
+    """
+    Collection handler to batch requests to
+    """
+
+    def get_rules(self):
+        return RULES
+
+    def get_param_schema(self):
+        return {'name': voluptuous.Coerce(unicode)}
+
+    def get(self):
+        name = self.cleaned_params.get('name', 'Bob')
+        self.serve_success([{'name': name}], extra_fields={'more': False})
+
+    def post(self):
+        self.serve_success(self.cleaned_data)
+
+
+class AuthHandler(handlers.RestHandlerBase):
+    """
+    Handler that requires a header from the batch request
+    """
+
+    def get(self):
+        if not self.request.headers.get('Authorization'):
+            raise handlers.rest_exceptions.AuthenticationException('No Auth')
+        self.serve_success(self.request.headers['Authorization'])
+
+
+app = webapp2.WSGIApplication([
+    ('/things', ThingsHandler),
+    ('/auth', AuthHandler),
+    ('/batch', batch.BatchHandler),
+])
+
+
+class BatchHandlerTests(BaseCase):
+    """
+    Tests surrounding dispatching batches of sub requests
+    """
+
+    def post_batch(self, sub_requests, **kwargs):
+        request = webapp2.Request.blank('/batch', method='POST', body=json.dumps(sub_requests),
+                                        content_type='application/json', **kwargs)
+        return request.get_response(app)
+
+    def test_base(self):
+        response = self.post_batch([
+            {'method': 'GET', 'path': '/things', 'params': {'name': u'Sue'}},
+            {'path': '/things?name=Joe'},
+            {'method': 'POST', 'path': '/things', 'body': {'name': 'Ann'}},
+            {'method': 'POST', 'path': '/things', 'body': {'size': 'large'}},
+            {'method': 'DELETE', 'path': '/things'},
+            {'path': '/nope'},
+        ])
+
+        self.assertEqual(response.status_int, 200)
+        results = json.loads(response.body)['results']
+
+        self.assertEqual([r['status'] for r in results], [200, 200, 200, 400, 405, 404])
+        self.assertEqual(results[0]['results'], [{'name': 'Sue'}])
+        self.assertEqual(results[0]['more'], False)
+        self.assertEqual(results[1]['results'], [{'name': 'Joe'}])
+        self.assertEqual(results[2]['results'], {'name': 'Ann'})
+
+    def test_headers_passed(self):
+        results = json.loads(self.post_batch([{'path': '/auth'}]).body)['results']
+        self.assertEqual(results[0]['status'], 401)
+
+        response = self.post_batch([{'path': '/auth'}], headers={'Authorization': 'Token 1'})
+        results = json.loads(response.body)['results']
+        self.assertEqual(results[0]['status'], 200)
+        self.assertEqual(results[0]['results'], 'Token 1')
+
+    @mock.patch('batch.API_BATCH_MAX_CONCURRENCY', 2)
+    def test_concurrent_reads_ordered(self):
+        names = [u'name%s' % i for i in range(5)]
+        sub_requests = [{'path': '/things', 'params': {'name': name}} for name in names]
+
+        with mock.patch('batch.threading.Thread', wraps=threading.Thread) as mock_thread:
+            results = json.loads(self.post_batch(sub_requests).body)['results']
+
+        self.assertEqual(mock_thread.call_count, 5)
+        self.assertEqual([r['results'][0]['name'] for r in results], names)
+
+    @mock.patch('batch.API_BATCH_MAX_REQUESTS', 2)
+    def test_invalid(self):
+        invalid_batches = [
+            {'path': '/things'},
+            [{'path': '/things'}] * 3,
+            ['/things'],
+            [{'path': '/things', 'cheese': True}],
+            [{'path': '/things', 'method': 'PATCH'}],
+            [{'path': 'things'}],
+            [{'path': '/batch'}],
+            [{'path': '/things', 'params': ['name']}],
+        ]
+
+        for sub_requests in invalid_batches:
+            self.assertEqual(self.post_batch(sub_requests).status_int, 400)
@@ -0,0 +1,84 @@
+"""
+Tests for response cache backends
+"""
+
+import mock
+from tests import BaseCase
+import cache
+
+
+class LocalCacheBackendTests(BaseCase):
+    """
+    Tests surrounding the in-process cache backend
+    """
+
+    def test_base(self):
+        backend = cache.LocalCacheBackend(max_size=10)
+
+        self.assertEqual(backend.get('key'), None)
+        backend.set('key', 'value')
+        self.assertEqual(backend.get('key'), 'value')
+        backend.delete('key')
+        self.assertEqual(backend.get('key'), None)
+
+    @mock.patch('cache.time.time')
+    def test_expiry(self, mock_time):
+        backend = cache.LocalCacheBackend()
+
+        mock_time.return_value = 1000
+        backend.set('key', 'value', ttl=60)
+
+        mock_time.return_value = 1059
+        self.assertEqual(backend.get('key'), 'value')
+
+        mock_time.return_value = 1061
+        self.assertEqual(backend.get('key'), None)
+
+    def test_incr(self):
+        backend = cache.LocalCacheBackend()
+        self.assertEqual(backend.incr('counter'), 1)
+        self.assertEqual(backend.incr('counter'), 2)
+
+
+class MemcacheBackendTests(BaseCase):
+    """
+    Tests surrounding the memcache backend
+    """
+
+    def test_base(self):
+        backend = cache.MemcacheBackend()
+
+        backend.set('key', 'value', ttl=60)
+        self.assertEqual(backend.get('key'), 'value')
+        backend.delete('key')
+        self.assertEqual(backend.get('key'), None)
+
+        self.assertEqual(backend.incr('counter'), 1)
+        self.assertEqual(backend.incr('counter'), 2)
+
+
+class InvalidateTests(BaseCase):
+    """
+    Tests surrounding cache generations per resource kind
+    """
+
+    def test_invalidate(self):
+        self.assertEqual(cache.get_generation('Post'), 0)
+
+        cache.invalidate('Post')
+        self.assertEqual(cache.get_generation('Post'), 1)
+        self.assertEqual(cache.get_generation('Author'), 0)
+
+
+class SafeSetTests(BaseCase):
+    """
+    Tests surrounding best effort cache writes
+    """
+
+    def test_base(self):
+        self.assertTrue(cache.safe_set('key', 'value', ttl=60))
+        self.assertEqual(cache.get_cache_backend().get('key'), 'value')
+
+    def test_too_large(self):
+        self.assertFalse(cache.safe_set('key', 'x' * 1100000, ttl=60))
+        self.assertEqual(cache.get_cache_backend().get('key'), None)
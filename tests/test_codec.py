@@ -0,0 +1,101 @@
+"""
+Tests for pluggable request and response codecs
+"""
+
+import datetime
+import mock
+import pytz
+from google.appengine.ext import ndb
+from tests import BaseCase
+import codec
+
+
+class MissingCodec(codec.JSONCodec):
+    """
+    Codec for a library that is not installed
+    """
+
+    def load_module(self):
+        import not_a_real_json_library
+        return not_a_real_json_library
+
+
+class JSONCodecTests(BaseCase):
+    """
+    Tests surrounding the stdlib json codec
+    """
+
+    def test_encode(self):
+        c = codec.JSONCodec()
+        self.assertEqual(c.encode({'b': 1, 'a': [1, 2]}), '{"a": [1, 2], "b": 1}')
+        self.assertEqual(c.encode({'b': 1, 'a': 2}, pretty=True), '{\n    "a": 2,\n    "b": 1\n}')
+
+    def test_decode(self):
+        c = codec.JSONCodec()
+        self.assertEqual(c.decode('{"a": [1, 2], "b": "c"}'), {'a': [1, 2], 'b': 'c'})
+        self.assertRaises(ValueError, c.decode, 'not json')
+
+
+class LoadCodecTests(BaseCase):
+    """
+    Tests surrounding resolving the configured codec
+    """
+
+    def test_default(self):
+        c = codec.load_codec(None)
+        self.assertTrue(type(c) is codec.JSONCodec)
+        self.assertTrue(c.sort_keys)
+
+        c = codec.load_codec('json', sort_keys=False)
+        self.assertFalse(c.sort_keys)
+
+    def test_path(self):
+        c = codec.load_codec('codec.SimpleJSONCodec')
+        self.assertTrue(isinstance(c, codec.JSONCodec))
+
+    @mock.patch.dict('codec.JSON_CODECS', {'missing': MissingCodec})
+    def test_fallback(self):
+        c = codec.load_codec('missing', sort_keys=False)
+        self.assertTrue(type(c) is codec.JSONCodec)
+        self.assertFalse(c.sort_keys)
+
+    def test_auto(self):
+        # Whichever codec is picked must produce equivalent output
+        c = codec.load_codec('auto')
+        payload = {'results': [{'name': u'Bob/Sue', 'count': 2}], 'status': 200}
+        self.assertEqual(c.decode(c.encode(payload)), payload)
+
+
+class MsgPackCodecTests(BaseCase):
+    """
+    Tests surrounding the binary msgpack codec
+    """
+
+    def test_round_trip(self):
+        c = codec.MsgPackCodec()
+        payload = {'results': [{'name': u'Bob', 'tags': ['a', 'b'], 'size': 2.5}], 'more': None}
+        self.assertEqual(c.decode(c.encode(payload)), payload)
+
+    def test_native_types(self):
+        c = codec.MsgPackCodec()
+        created = datetime.datetime(2016, 1, 2, 3, 4, 5, 6)
+        point = ndb.GeoPt(lat=40.7, lon=-74.0)
+
+        result = c.decode(c.encode({'created': created, 'point': point}))
+        self.assertEqual(result['created'], created.replace(tzinfo=pytz.utc))
+        self.assertEqual(result['point'], point)
+
+        # Aware datetimes are converted to UTC
+        eastern = pytz.timezone('US/Eastern').localize(created)
+        self.assertEqual(c.decode(c.encode(eastern)), eastern.astimezone(pytz.utc))
+
+        self.assertRaises(TypeError, c.encode, object())
+
+    def test_get_binary_codec(self):
+        self.assertIsNone(codec.get_binary_codec(codec.MSGPACK_CONTENT_TYPE))
+
+        with mock.patch('codec.API_MSGPACK_ENABLED', True):
+            c = codec.get_binary_codec(codec.MSGPACK_CONTENT_TYPE)
+            self.assertTrue(isinstance(c, codec.MsgPackCodec))
+            self.assertIsNone(codec.get_binary_codec('application/json'))
+            self.assertEqual(codec.get_binary_content_types(), [codec.MSGPACK_CONTENT_TYPE])
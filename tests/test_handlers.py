@@ -1 +1,622 @@
-# TODO: Write tests for base handlers
+"""
+Tests for the base rest handlers
+"""
+
+import datetime
+import json
+import mock
+import msgpack
+import pytz
+import voluptuous
+import webapp2
+import zlib
+from google.appengine.ext import ndb
+from tests import BaseCase
+import codec
+import exc
+import handlers
+import resources
+
+
+RULES = [resources.RestField('name'), resources.RestField('size', verbose_only=True)]
+
+
+class ThingsHandler(handlers.RestHandlerBase):
+    """
+    Collection handler to test against
+    """
+
+    def get_rules(self):
+        return RULES
+
+    def get_param_schema(self):
+        return {'stream': voluptuous.Coerce(bool)}
+
+    def get(self):
+        objs = [{'name': 'Bob', 'size': 'large'}, {'name': 'Sue', 'size': 'small'}]
+
+        if self.cleaned_params.get('stream'):
+            self.serve_success(self.serialize(iter(objs)), extra_fields={'more': False})
+        else:
+            self.serve_success(self.serialize(objs), extra_fields={'more': False})
+
+    def post(self):
+        self.serve_success(self.cleaned_data)
+
+
+class DynamicParamsHandler(ThingsHandler):
+    """
+    Handler with a param schema that is not cached
+    """
+    cache_param_schema = False
+
+
+class CachedThingsHandler(ThingsHandler):
+    """
+    Handler with response caching enabled
+    """
+    cache_ttl = 60
+    cache_kind = 'Thing'
+    get_calls = 0
+
+    def get(self):
+        CachedThingsHandler.get_calls += 1
+        super(CachedThingsHandler, self).get()
+
+
+class SharedCacheThingsHandler(CachedThingsHandler):
+    """
+    Handler caching responses for everyone with the same X-Role
+    """
+
+    def get_cache_scope(self):
+        return self.request.headers.get('X-Role', '')
+
+
+class VersionedThingsHandler(ThingsHandler):
+    """
+    Handler that knows the version of its resources
+    """
+    get_calls = 0
+
+    def get(self):
+        VersionedThingsHandler.get_calls += 1
+        super(VersionedThingsHandler, self).get()
+
+    def get_resource_version(self):
+        return '2016-01-01T00:00:00Z'
+
+
+class BrokenStreamHandler(handlers.RestHandlerBase):
+    """
+    Handler that fails part way through streaming results
+    """
+
+    def get(self):
+        def results():
+            yield {'name': 'Bob'}
+            raise Exception('Stream Broke')
+
+        self.serve_success(results())
+
+
+class Author(ndb.Model):
+    """
+    A datastore model for async handlers to fetch
+    """
+    name = ndb.StringProperty()
+
+
+ASYNC_RULES = [
+    resources.RestField('name'),
+    resources.ResourceField('author', 'author_key', [resources.RestField('name')]),
+]
+
+
+class AsyncThingsHandler(handlers.RestHandlerBase):
+    """
+    Handler that is a tasklet
+    """
+
+    def get_rules(self):
+        return ASYNC_RULES
+
+    def get_param_schema(self):
+        return {'missing': voluptuous.Coerce(bool)}
+
+    @ndb.tasklet
+    def get(self):
+        if self.cleaned_params.get('missing'):
+            author = yield ndb.Key(Author, 'missing').get_async()
+            if not author:
+                raise exc.DoesNotExistException('Author not found')
+
+        author_keys = yield Author.query().fetch_async(keys_only=True)
+        objs = [{'name': 'Bob', 'author_key': author_keys[0]}]
+        results = yield self.serialize_async(objs)
+        self.serve_success(results)
+
+
+NATIVE_RULES = [
+    resources.RestField('name'),
+    resources.DatetimeField('created'),
+    resources.GeoField('points'),
+]
+
+
+class NativeThingsHandler(handlers.RestHandlerBase):
+    """
+    Handler outputting datetimes and geo points
+    """
+
+    def get_rules(self):
+        return NATIVE_RULES
+
+    def get_param_schema(self):
+        return {'stream': voluptuous.Coerce(bool)}
+
+    def get(self):
+        objs = [{'name': 'Bob', 'created': datetime.datetime(2016, 1, 2, 3, 4, 5),
+                 'points': [ndb.GeoPt(lat=1.5, lon=2.5)]}]
+
+        if self.cleaned_params.get('stream'):
+            self.serve_success(self.serialize(iter(objs)))
+        else:
+            self.serve_success(self.serialize(objs))
+
+    def post(self):
+        self.serve_success(self.cleaned_data)
+
+
+app = webapp2.WSGIApplication([
+    ('/things', ThingsHandler),
+    ('/dynamic', DynamicParamsHandler),
+    ('/cached', CachedThingsHandler),
+    ('/shared', SharedCacheThingsHandler),
+    ('/versioned', VersionedThingsHandler),
+    ('/broken', BrokenStreamHandler),
+    ('/async', AsyncThingsHandler),
+    ('/native', NativeThingsHandler),
+])
+
+
+class HandlerBaseCase(BaseCase):
+    """
+    Base Test Case for handlers
+    """
+
+    def get_response(self, path, method='GET', **kwargs):
+        request = webapp2.Request.blank(path, method=method, **kwargs)
+        return request.get_response(app)
+
+
+class ServeResponseTests(HandlerBaseCase):
+    """
+    Tests surrounding outputting a response envelope
+    """
+
+    def test_base(self):
+        response = self.get_response('/things')
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.headers['Content-Type'], 'application/json')
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'http://example.com')
+
+        payload = json.loads(response.body)
+        self.assertEqual(payload['status'], 200)
+        self.assertEqual(payload['messages'], [None])
+        self.assertEqual(payload['more'], False)
+        self.assertEqual([r['name'] for r in payload['results']], ['Bob', 'Sue'])
+
+    def test_fields(self):
+        for path in ['/things?fields=size', '/things?stream=1&fields=size']:
+            payload = json.loads(self.get_response(path).body)
+
+            self.assertEqual(payload['results'][0],
+                             {'size': 'large',
+                              '_meta': {'is_verbose': False, 'resource_type': 'NonDefinedClass',
+                                        'omitted_fields': ['name']}})
+
+    def test_rows(self):
+        payload = json.loads(self.get_response('/things?format=rows&verbose=1').body)
+
+        self.assertEqual(payload['columns'], ['name', 'size'])
+        self.assertEqual(payload['results'], [['Bob', 'large'], ['Sue', 'small']])
+        self.assertEqual(payload['_meta'], {'is_verbose': True,
+                                            'resource_type': 'NonDefinedClass'})
+        self.assertEqual(payload['more'], False)
+
+    def test_whitelisted_origin(self):
+        response = self.get_response('/things', headers={'Origin': 'http://www.example.com'})
+        self.assertEqual(response.headers['Access-Control-Allow-Origin'], 'http://www.example.com')
+
+    def test_options(self):
+        # Test to ensure preflight responses are cacheable
+        response = self.get_response('/things', method='OPTIONS')
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.headers['Access-Control-Max-Age'], '600')
+        self.assertEqual(response.headers['Vary'], 'Origin')
+
+    def test_streamed(self):
+        # Test to ensure a streamed response matches the buffered one
+        response = self.get_response('/things?stream=1')
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(json.loads(response.body), json.loads(self.get_response('/things').body))
+
+    def test_streamed_error(self):
+        # Test to ensure errors mid stream are still reported and the output is valid
+        response = self.get_response('/broken')
+
+        payload = json.loads(response.body)
+        self.assertEqual(payload['results'], [{'name': 'Bob'}])
+        self.assertEqual(payload['messages'], [None, 'Stream Broke'])
+
+    def test_method_not_allowed(self):
+        response = self.get_response('/things', method='DELETE')
+        self.assertEqual(response.status_int, 405)
+        self.assertEqual(json.loads(response.body)['status'], 405)
+
+
+class ValidateParamsTests(HandlerBaseCase):
+    """
+    Tests surrounding validating query params
+    """
+
+    def setUp(self):
+        super(ValidateParamsTests, self).setUp()
+        handlers._compiled_param_schemas.clear()
+
+    def test_cached(self):
+        with mock.patch.object(ThingsHandler, 'get_param_schema',
+                               return_value={'stream': voluptuous.Coerce(bool)}) as mock_schema:
+            self.assertEqual(self.get_response('/things?stream=1').status_int, 200)
+            self.assertEqual(self.get_response('/things?verbose=1').status_int, 200)
+
+        self.assertEqual(mock_schema.call_count, 1)
+
+    def test_not_cached(self):
+        with mock.patch.object(DynamicParamsHandler, 'get_param_schema',
+                               return_value={}) as mock_schema:
+            self.get_response('/dynamic')
+            self.get_response('/dynamic')
+
+        self.assertEqual(mock_schema.call_count, 2)
+
+    def test_own_format(self):
+        with mock.patch.object(ThingsHandler, 'get_param_schema',
+                               return_value={'format': voluptuous.Any('csv', 'json')}):
+            response = self.get_response('/things?format=csv')
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(json.loads(response.body)['results'][0]['name'], 'Bob')
+
+    def test_warmup(self):
+        resource_params = ThingsHandler.warmup()
+        self.assertTrue(handlers._compiled_param_schemas[ThingsHandler] is resource_params)
+        self.assertEqual(resource_params.from_dict({'stream': '1'}), {'stream': True})
+
+
+class ResponseCacheTests(HandlerBaseCase):
+    """
+    Tests surrounding caching GET responses
+    """
+
+    def setUp(self):
+        super(ResponseCacheTests, self).setUp()
+        CachedThingsHandler.get_calls = 0
+
+    def test_cached(self):
+        response1 = self.get_response('/cached')
+        response2 = self.get_response('/cached')
+
+        self.assertEqual(CachedThingsHandler.get_calls, 1)
+        self.assertEqual(response2.status_int, 200)
+        self.assertEqual(response1.body, response2.body)
+        self.assertEqual(response2.headers['Content-Type'], 'application/json')
+
+        # Different params and credentials are cached separately
+        self.get_response('/cached?verbose=1')
+        self.get_response('/cached', headers={'Authorization': 'Bearer bob'})
+        self.get_response('/cached', headers={'Cookie': 'session=sue'})
+        self.assertEqual(CachedThingsHandler.get_calls, 4)
+        self.get_response('/cached', headers={'Authorization': 'Bearer bob'})
+        self.assertEqual(CachedThingsHandler.get_calls, 4)
+
+        # Handlers that do not serve NDJSON still use the cache for clients that accept it
+        response3 = self.get_response('/cached', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(CachedThingsHandler.get_calls, 4)
+        self.assertEqual(response3.body, response1.body)
+
+    def test_scope(self):
+        self.get_response('/shared', headers={'Authorization': 'Bearer bob', 'X-Role': 'admin'})
+        self.get_response('/shared', headers={'Authorization': 'Bearer sue', 'X-Role': 'admin'})
+        self.assertEqual(CachedThingsHandler.get_calls, 1)
+
+        self.get_response('/shared', headers={'Authorization': 'Bearer joe', 'X-Role': 'user'})
+        self.assertEqual(CachedThingsHandler.get_calls, 2)
+
+    def test_not_enabled(self):
+        with mock.patch('handlers.rest_cache.get_cache_backend') as mock_backend:
+            self.get_response('/things')
+        self.assertFalse(mock_backend.called)
+
+    def test_invalidated_by_write(self):
+        self.get_response('/cached')
+        response = self.get_response('/cached', method='POST', body='{"name": "Joe"}',
+                                     content_type='application/json')
+        self.assertEqual(response.status_int, 200)
+
+        self.get_response('/cached')
+        self.assertEqual(CachedThingsHandler.get_calls, 2)
+
+    def test_too_large(self):
+        def get(handler):
+            handler.serve_success([{'name': 'x' * 1100000}])
+
+        # memcache refuses values over 1MB - the response is served but not cached
+        with mock.patch.object(ThingsHandler, 'get', get):
+            response = self.get_response('/cached')
+            self.assertEqual(response.status_int, 200)
+            self.assertEqual(len(json.loads(response.body)['results'][0]['name']), 1100000)
+
+            self.get_response('/cached')
+        self.assertEqual(CachedThingsHandler.get_calls, 2)
+
+    def test_errors_not_cached(self):
+        with mock.patch.object(ThingsHandler, 'get', side_effect=Exception('Broke')):
+            self.assertEqual(self.get_response('/cached').status_int, 500)
+
+        self.assertEqual(self.get_response('/cached').status_int, 200)
+
+
+class ConditionalGetTests(HandlerBaseCase):
+    """
+    Tests surrounding ETags, conditional GETs and HEAD requests
+    """
+
+    def test_etag(self):
+        response = self.get_response('/things')
+        etag = response.headers['ETag']
+        self.assertTrue(etag)
+
+        response = self.get_response('/things', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.body, '')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.get_response('/things', headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_int, 200)
+        self.assertTrue(response.body)
+
+    def test_errors_have_no_etag(self):
+        with mock.patch.object(ThingsHandler, 'get', side_effect=Exception('Broke')):
+            response = self.get_response('/things')
+        self.assertFalse('ETag' in response.headers)
+
+    def test_version(self):
+        VersionedThingsHandler.get_calls = 0
+
+        etag = self.get_response('/versioned').headers['ETag']
+        response = self.get_response('/versioned', headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(VersionedThingsHandler.get_calls, 1)
+
+        # Representations with other params have their own ETag
+        self.assertNotEqual(self.get_response('/versioned?verbose=1').headers['ETag'], etag)
+
+    def test_head(self):
+        get_response = self.get_response('/things')
+        response = self.get_response('/things', method='HEAD')
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.body, '')
+        self.assertEqual(response.headers['ETag'], get_response.headers['ETag'])
+        self.assertEqual(response.headers['Content-Length'], str(len(get_response.body)))
+
+        self.assertEqual(self.get_response('/broken', method='HEAD').status_int, 200)
+
+
+@mock.patch('handlers.API_COMPRESSION_ENABLED', True)
+@mock.patch('handlers.API_COMPRESSION_MIN_SIZE', 10)
+class CompressionTests(HandlerBaseCase):
+    """
+    Tests surrounding compressing responses
+    """
+
+    def test_gzip(self):
+        plain = self.get_response('/things')
+        response = self.get_response('/things', headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Origin, Accept-Encoding')
+        self.assertEqual(zlib.decompress(response.body, 16 + zlib.MAX_WBITS), plain.body)
+        self.assertNotEqual(response.headers['ETag'], plain.headers['ETag'])
+
+        # Conditional GETs match the compressed entity
+        response = self.get_response('/things', headers={'Accept-Encoding': 'gzip',
+                                                         'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_int, 304)
+
+    def test_version(self):
+        VersionedThingsHandler.get_calls = 0
+
+        response = self.get_response('/versioned', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+        # The compressed entity's ETag is answered without running the handler
+        response = self.get_response('/versioned', headers={'Accept-Encoding': 'gzip',
+                                                            'If-None-Match': response.etag})
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(VersionedThingsHandler.get_calls, 1)
+
+    def test_streamed(self):
+        plain = self.get_response('/things?stream=1')
+        response = self.get_response('/things?stream=1', headers={'Accept-Encoding': 'deflate'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.body), plain.body)
+
+    def test_below_min_size(self):
+        with mock.patch('handlers.API_COMPRESSION_MIN_SIZE', 100000):
+            response = self.get_response('/things', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertFalse('Content-Encoding' in response.headers)
+        self.assertEqual(json.loads(response.body)['status'], 200)
+
+    def test_not_accepted(self):
+        response = self.get_response('/things')
+        self.assertFalse('Content-Encoding' in response.headers)
+
+
+class ValidatePayloadTests(HandlerBaseCase):
+    """
+    Tests surrounding validating request payloads
+    """
+
+    def post(self, payload, path='/things'):
+        return self.get_response(path, method='POST', body=json.dumps(payload),
+                                 content_type='application/json')
+
+    def test_single(self):
+        response = self.post({'name': 'Bob', 'size': 'large'})
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(json.loads(response.body)['results'], {'name': 'Bob', 'size': 'large'})
+
+    def test_list(self):
+        response = self.post([{'name': 'Bob'}, {'name': 'Sue', 'size': 'small'}])
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(json.loads(response.body)['results'],
+                         [{'name': 'Bob'}, {'name': 'Sue', 'size': 'small'}])
+
+    def test_list_errors(self):
+        response = self.post([{'name': 'Bob'}, {'color': 'red'}, 'Joe'])
+
+        self.assertEqual(response.status_int, 400)
+        payload = json.loads(response.body)
+        self.assertEqual(payload['messages'], ['2 of 3 payload items are invalid.'])
+        self.assertEqual([error['index'] for error in payload['errors']], [1, 2])
+
+    def test_single_errors(self):
+        response = self.post({'name': 'Bob', 'color': 'red'})
+
+        self.assertEqual(response.status_int, 400)
+        self.assertEqual(json.loads(response.body)['messages'],
+                         ['key "color" is not an allowed input field for a resource.'])
+
+    def test_field_errors(self):
+        # Bad values are reported per item rather than failing the whole payload
+        response = self.post([{'created': '2016-01-02T03:04:05Z'}, {'created': 'yesterday'},
+                              {'points': [{'lon': 1}]}], path='/native')
+
+        self.assertEqual(response.status_int, 400)
+        payload = json.loads(response.body)
+        self.assertEqual(payload['messages'], ['2 of 3 payload items are invalid.'])
+        self.assertEqual([error['index'] for error in payload['errors']], [1, 2])
+        self.assertIn('yesterday', payload['errors'][0]['message'])
+
+        response = self.post({'created': 'yesterday'}, path='/native')
+        self.assertEqual(response.status_int, 400)
+
+
+class AsyncHandlerTests(HandlerBaseCase):
+    """
+    Tests surrounding handler methods that return futures
+    """
+
+    def test_tasklet(self):
+        Author(name='Sue').put()
+        response = self.get_response('/async')
+
+        self.assertEqual(response.status_int, 200)
+        result = json.loads(response.body)['results'][0]
+        self.assertEqual(result['name'], 'Bob')
+        self.assertEqual(result['author']['name'], 'Sue')
+
+    def test_errors(self):
+        response = self.get_response('/async?missing=1')
+        self.assertEqual(response.status_int, 404)
+        self.assertEqual(json.loads(response.body)['messages'], ['Author not found'])
+
+
+@mock.patch('codec.API_MSGPACK_ENABLED', True)
+class MsgPackTests(HandlerBaseCase):
+    """
+    Tests surrounding negotiating the binary msgpack codec
+    """
+
+    def get_msgpack(self, path, **kwargs):
+        response = self.get_response(path, headers={'Accept': 'application/x-msgpack'}, **kwargs)
+
+        self.assertEqual(response.headers['Content-Type'], 'application/x-msgpack')
+        self.assertEqual(response.headers['Vary'], 'Origin, Accept')
+        return response, codec.MsgPackCodec().decode(response.body)
+
+    def test_base(self):
+        response, payload = self.get_msgpack('/things')
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(payload['results'], [{'name': 'Bob', '_meta': mock.ANY},
+                                              {'name': 'Sue', '_meta': mock.ANY}])
+
+        # JSON is still the default
+        response = self.get_response('/things')
+        self.assertEqual(response.headers['Content-Type'], 'application/json')
+        self.assertEqual(response.headers['Vary'], 'Origin, Accept')
+
+    def test_native_types(self):
+        response, payload = self.get_msgpack('/native')
+        result = payload['results'][0]
+        self.assertEqual(result['created'], datetime.datetime(2016, 1, 2, 3, 4, 5, tzinfo=pytz.utc))
+        self.assertEqual(result['points'], [ndb.GeoPt(lat=1.5, lon=2.5)])
+
+        # JSON output is unchanged
+        result = json.loads(self.get_response('/native').body)['results'][0]
+        self.assertEqual(result['created'], '2016-01-02T03:04:05Z')
+        self.assertEqual(result['points'], [{'lat': 1.5, 'lon': 2.5}])
+
+    def test_streamed(self):
+        response, payload = self.get_msgpack('/things?stream=1')
+        self.assertEqual([r['name'] for r in payload['results']], ['Bob', 'Sue'])
+        self.assertFalse(payload['more'])
+
+        # Streamed results are encoded natively like buffered ones
+        response, payload = self.get_msgpack('/native?stream=1')
+        self.assertEqual(payload, self.get_msgpack('/native')[1])
+        result = payload['results'][0]
+        self.assertEqual(result['created'], datetime.datetime(2016, 1, 2, 3, 4, 5, tzinfo=pytz.utc))
+        self.assertEqual(result['points'], [ndb.GeoPt(lat=1.5, lon=2.5)])
+
+    def test_payload(self):
+        created = datetime.datetime(2016, 1, 2, 3, 4, 5)
+        body = msgpack.packb({'name': 'Bob', 'created': '2016-01-02T03:04:05Z'})
+        response, payload = self.get_msgpack('/native', method='POST', body=body,
+                                             content_type='application/x-msgpack')
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(payload['results']['created'], created.replace(tzinfo=pytz.utc))
+
+        # Native datetimes and geo points are accepted as input
+        body = codec.MsgPackCodec().encode({'created': created, 'points': [ndb.GeoPt(1, 2)]})
+        response, payload = self.get_msgpack('/native', method='POST', body=body,
+                                             content_type='application/x-msgpack')
+
+        self.assertEqual(payload['results']['created'], created.replace(tzinfo=pytz.utc))
+        self.assertEqual(payload['results']['points'], [ndb.GeoPt(1, 2)])
+
+    def test_cached(self):
+        CachedThingsHandler.get_calls = 0
+
+        json_body = self.get_response('/cached').body
+        self.get_msgpack('/cached')
+        self.assertEqual(CachedThingsHandler.get_calls, 2)
+
+        # Each content type is served from its own cache entry
+        response, payload = self.get_msgpack('/cached')
+        self.assertEqual(self.get_response('/cached').body, json_body)
+        self.assertEqual(CachedThingsHandler.get_calls, 2)
+        self.assertEqual(len(payload['results']), 2)
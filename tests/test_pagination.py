@@ -0,0 +1,227 @@
+"""
+Tests for cursor pagination of collection endpoints
+"""
+
+import itertools
+import json
+import mock
+import voluptuous
+import webapp2
+from google.appengine.ext import ndb
+from tests import BaseCase
+import cache
+import handlers
+import pagination
+import resources
+
+RULES = [resources.RestField('name')]
+
+
+class Post(ndb.Model):
+    """
+    A datastore model to paginate
+    """
+    name = ndb.StringProperty()
+
+
+class PostsHandler(handlers.RestHandlerBase):
+    """
+    Collection handler to test against
+    """
+    serves_ndjson = True
+
+    def get_rules(self):
+        return RULES
+
+    def get_param_schema(self):
+        return pagination.PARAM_SCHEMA
+
+    def get(self):
+        self.serve_page(Post.query().order(Post.name), prefetch=True)
+
+
+app = webapp2.WSGIApplication([('/posts', PostsHandler)])
+
+
+class PaginateTests(BaseCase):
+    """
+    Tests surrounding fetching and serializing pages of a query
+    """
+
+    def setUp(self):
+        super(PaginateTests, self).setUp()
+        ndb.put_multi([Post(name=name) for name in ['a', 'b', 'c', 'd', 'e']])
+        self.query = Post.query().order(Post.name)
+
+    def test_base(self):
+        page = pagination.paginate(self.query, None, 2, RULES)
+        self.assertEqual([r['name'] for r in page['results']], ['a', 'b'])
+        self.assertTrue(page['more'])
+
+        page = pagination.paginate(self.query, page['next_cursor'], 2, RULES)
+        self.assertEqual([r['name'] for r in page['results']], ['c', 'd'])
+
+        page = pagination.paginate(self.query, page['next_cursor'], 2, RULES)
+        self.assertEqual([r['name'] for r in page['results']], ['e'])
+        self.assertFalse(page['more'])
+        self.assertIsNone(page['next_cursor'])
+
+    def test_rows(self):
+        page = pagination.paginate(self.query, None, 2, RULES, rows=True)
+        self.assertEqual(page['results'].rows, [('a',), ('b',)])
+        self.assertTrue(page['more'])
+
+    def test_prefetch(self):
+        page = pagination.paginate(self.query, None, 2, RULES, prefetch=True)
+
+        # The follow up request is served from the prefetched page
+        with mock.patch.object(ndb.Query, 'fetch_page') as mock_fetch:
+            next_page = pagination.paginate(self.query, page['next_cursor'], 2, RULES,
+                                            prefetch=True)
+        self.assertFalse(mock_fetch.called)
+        self.assertEqual([r['name'] for r in next_page['results']], ['c', 'd'])
+
+        # Invalidating the kind drops prefetched pages
+        cache.invalidate('Post')
+        empty_page = ([], None, False)
+        with mock.patch.object(ndb.Query, 'fetch_page', return_value=empty_page) as mock_fetch:
+            pagination.paginate(self.query, page['next_cursor'], 2, RULES, prefetch=True)
+        self.assertTrue(mock_fetch.called)
+
+    def test_prefetch_errors(self):
+        # A page that cannot be cached (i.e. over 1MB) is still served and just not prefetched
+        with mock.patch('cache.MemcacheBackend.set', side_effect=ValueError('Too large')):
+            page = pagination.paginate(self.query, None, 2, RULES, prefetch=True)
+        self.assertEqual([r['name'] for r in page['results']], ['a', 'b'])
+
+        # Neither is a failed fetch of the next page
+        failed = ndb.Future()
+        failed.set_exception(Exception('Broke'))
+        with mock.patch('pagination.prefetch_page_async', return_value=failed):
+            page = pagination.paginate(self.query, None, 2, RULES, prefetch=True)
+        self.assertEqual([r['name'] for r in page['results']], ['a', 'b'])
+
+    def test_no_prefetch(self):
+        page = pagination.paginate(self.query, None, 2, RULES)
+
+        # Pages without prefetch never touch the cache
+        with mock.patch('pagination.rest_cache') as mock_cache:
+            next_page = pagination.paginate(self.query, page['next_cursor'], 2, RULES)
+        self.assertFalse(mock_cache.method_calls)
+        self.assertEqual([r['name'] for r in next_page['results']], ['c', 'd'])
+
+    def test_handler(self):
+        response = webapp2.Request.blank('/posts?limit=3').get_response(app)
+        payload = json.loads(response.body)
+
+        self.assertEqual([r['name'] for r in payload['results']], ['a', 'b', 'c'])
+        self.assertTrue(payload['more'])
+
+        path = '/posts?limit=3&cursor=%s' % payload['next_cursor']
+        response = webapp2.Request.blank(path).get_response(app)
+        payload = json.loads(response.body)
+
+        self.assertEqual([r['name'] for r in payload['results']], ['d', 'e'])
+        self.assertEqual(payload['more'], False)
+        self.assertEqual(payload['next_cursor'], None)
+
+    def test_ndjson_not_served(self):
+        with mock.patch.object(PostsHandler, 'serves_ndjson', False):
+            request = webapp2.Request.blank('/posts', headers={'Accept': 'application/x-ndjson'})
+            response = request.get_response(app)
+
+        self.assertEqual(response.headers['Content-Type'], 'application/json')
+        self.assertEqual(response.headers['Vary'], 'Origin')
+        self.assertEqual(len(json.loads(response.body)['results']), 5)
+
+    def test_limit_param(self):
+        schema = voluptuous.Schema(pagination.PARAM_SCHEMA)
+        self.assertRaises(voluptuous.Invalid, schema, {'limit': '0'})
+        self.assertRaises(voluptuous.Invalid, schema, {'limit': '1000'})
+
+
+class NDJSONExportTests(BaseCase):
+    """
+    Tests surrounding streaming a whole query as newline delimited JSON
+    """
+
+    def setUp(self):
+        super(NDJSONExportTests, self).setUp()
+        ndb.put_multi([Post(name=name) for name in ['a', 'b', 'c', 'd', 'e']])
+
+    def get_lines(self, path):
+        request = webapp2.Request.blank(path, headers={'Accept': 'application/x-ndjson'})
+        response = request.get_response(app)
+
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response.headers['Vary'], 'Origin, Accept')
+        return [json.loads(line) for line in response.body.splitlines()]
+
+    @mock.patch('pagination.API_EXPORT_BATCH_SIZE', 2)
+    def test_base(self):
+        lines = self.get_lines('/posts')
+
+        self.assertEqual([line['name'] for line in lines[:-1]], ['a', 'b', 'c', 'd', 'e'])
+        trailer = lines[-1]['_trailer']
+        self.assertEqual((trailer['count'], trailer['more']), (5, False))
+        self.assertTrue(trailer['next_cursor'])  # Where to pick up entities added later
+
+    def test_resume(self):
+        with mock.patch.object(PostsHandler, 'serve_page',
+                               lambda self, query, **kwargs: self.serve_ndjson(
+                                   query, batch_size=2, max_results=2)):
+            lines = self.get_lines('/posts')
+            self.assertEqual([line['name'] for line in lines[:-1]], ['a', 'b'])
+
+            trailer = lines[-1]['_trailer']
+            self.assertEqual((trailer['count'], trailer['more']), (2, True))
+
+            lines = self.get_lines('/posts?cursor=%s' % trailer['next_cursor'])
+            self.assertEqual([line['name'] for line in lines[:-1]], ['c', 'd'])
+
+    @mock.patch('pagination.API_EXPORT_BATCH_SIZE', 2)
+    @mock.patch('handlers.API_EXPORT_MAX_RESULTS', 3)
+    def test_max_results(self):
+        lines = self.get_lines('/posts')
+
+        # Exports stop after the page that reaches the cap and the trailer resumes after it
+        self.assertEqual([line['name'] for line in lines[:-1]], ['a', 'b', 'c', 'd'])
+        trailer = lines[-1]['_trailer']
+        self.assertEqual((trailer['count'], trailer['more']), (4, True))
+
+        lines = self.get_lines('/posts?cursor=%s' % trailer['next_cursor'])
+        self.assertEqual([line['name'] for line in lines[:-1]], ['e'])
+        self.assertEqual(lines[-1]['_trailer']['more'], False)
+
+    @mock.patch('pagination.API_EXPORT_BATCH_SIZE', 2)
+    @mock.patch('handlers.API_EXPORT_TIME_LIMIT', 30)
+    def test_time_limit(self):
+        # Each page takes 20 seconds
+        with mock.patch('handlers.time') as mock_time:
+            mock_time.time.side_effect = itertools.count(0, 20).next
+            lines = self.get_lines('/posts')
+
+        self.assertEqual([line['name'] for line in lines[:-1]], ['a', 'b', 'c', 'd'])
+        trailer = lines[-1]['_trailer']
+        self.assertEqual((trailer['count'], trailer['more']), (4, True))
+        self.assertTrue(trailer['next_cursor'])
+
+    @mock.patch('pagination.API_EXPORT_BATCH_SIZE', 2)
+    def test_error(self):
+        serializer = resources.get_serializer(RULES)
+        real_to_list = serializer.to_list
+
+        def to_list(objs, **kwargs):
+            if objs[0].name == 'c':
+                raise Exception('Broke')
+            return real_to_list(objs, **kwargs)
+
+        with mock.patch.object(serializer, 'to_list', side_effect=to_list):
+            lines = self.get_lines('/posts')
+
+        # The trailer resumes after the last complete page
+        self.assertEqual([line['name'] for line in lines[:-1]], ['a', 'b'])
+        trailer = lines[-1]['_trailer']
+        self.assertEqual((trailer['count'], trailer['more'], trailer['error']), (2, True, 'Broke'))
+        self.assertTrue(trailer['next_cursor'])
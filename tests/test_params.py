@@ -2,6 +2,7 @@
 Test for custom param coersion back and forth between REST input and native representation
 """
 
+import voluptuous
 from tests import BaseCase
 from google.appengine.datastore.datastore_query import Cursor
 from google.appengine.api.datastore_errors import BadValueError
@@ -12,6 +13,48 @@ test_dtstr = "1982-09-02T05:30:15Z"
 test_dtobj = datetime.datetime(year=1982, month=9, day=2, hour=5, minute=30, second=15)
 
 
+class ResourceParamsTests(BaseCase):
+    """ Tests for validating query params """
+
+    def test_base(self):
+        param_schema = {'limit': voluptuous.Coerce(int)}
+        resource_params = params.ResourceParams(param_schema)
+
+        result = resource_params.from_dict({'limit': '5', 'verbose': '1'})
+        self.assertEqual(result, {'limit': 5, 'verbose': True})
+        self.assertRaises(voluptuous.Invalid, resource_params.from_dict, {'cheese': '1'})
+
+        # The given schema is not modified with the built in params
+        self.assertEqual(param_schema.keys(), ['limit'])
+
+    def test_fields(self):
+        resource_params = params.ResourceParams({})
+
+        result = resource_params.from_dict({'fields': 'title, author.name,,'})
+        self.assertEqual(result, {'fields': ['title', 'author.name']})
+        self.assertEqual(resource_params.from_dict({'fields': ''}), {'fields': None})
+        self.assertRaises(voluptuous.Invalid, resource_params.from_dict, {'fields': 5})
+
+        # A handler's own fields param is not replaced
+        resource_params = params.ResourceParams({'fields': voluptuous.Any('all', 'some')})
+        self.assertEqual(resource_params.from_dict({'fields': 'all'}), {'fields': 'all'})
+
+    def test_format(self):
+        resource_params = params.ResourceParams({})
+
+        self.assertEqual(resource_params.from_dict({'format': 'rows'}), {'format': 'rows'})
+        self.assertRaises(voluptuous.Invalid, resource_params.from_dict, {'format': 'cheese'})
+
+        # A handler's own format param is not replaced
+        resource_params = params.ResourceParams({'format': voluptuous.Any('csv', 'json')})
+        self.assertEqual(resource_params.from_dict({'format': 'csv'}), {'format': 'csv'})
+        self.assertRaises(voluptuous.Invalid, resource_params.from_dict, {'format': 'rows'})
+
+    def test_compiled_once(self):
+        resource_params = params.ResourceParams({})
+        self.assertTrue(resource_params.get_schema() is resource_params.get_schema())
+
+
 class CoerceToCursorTests(BaseCase):
     """ Tests for voluptuous coersion to str to ndb cursor object """
 
@@ -39,6 +82,9 @@ class CoerceToDatetimeTests(BaseCase):
 
     def test_error(self):
         self.assertRaises(ValueError, params.coerce_to_datetime, "invalid")
+        self.assertRaises(ValueError, params.coerce_to_datetime, "1982-13-02")
+        self.assertRaises(ValueError, params.coerce_to_datetime, "1982-09-02T05:30:15Zcheese")
+        self.assertRaises(ValueError, params.coerce_to_datetime, "1982-09-02T05:30:15Z\n")
 
     def test_timestamp(self):
         result = params.coerce_to_datetime(test_dtstr)
@@ -52,6 +98,18 @@ class CoerceToDatetimeTests(BaseCase):
         self.assertEqual([result.year, result.month, result.day], [1982, 9, 2])
         self.assertEqual([result.hour, result.minute, result.second], [0, 0, 0])
 
+    def test_iso_variants(self):
+        expected = datetime.datetime(1982, 9, 2, 5, 30, 15, tzinfo=params.UTC)
+
+        for dtstr in ["1982-09-02T05:30:15", "1982-09-02 05:30:15Z", "1982-09-02T07:30:15+02:00",
+                      "1982-09-02T00:00:15-0530", "1982-09-02T06:30:15+01"]:
+            result = params.coerce_to_datetime(dtstr)
+            self.assertEqual(result, expected)
+            self.assertTrue(result.tzinfo is params.UTC)
+
+        result = params.coerce_to_datetime("1982-09-02T05:30:15.25Z")
+        self.assertEqual(result.microsecond, 250000)
+
 
 class CoerceFromDatetimeTests(BaseCase):
     """ Tests for voluptuous coersion from datetime object to str for output """
@@ -65,3 +123,10 @@ class CoerceFromDatetimeTests(BaseCase):
 
     def test_base(self):
         self.assertEqual(params.coerce_from_datetime(test_dtobj), test_dtstr)
+        self.assertEqual(params.coerce_from_datetime(datetime.date(1982, 9, 2)),
+                         "1982-09-02T00:00:00Z")
+
+    def test_many(self):
+        dts = [test_dtobj, None, test_dtobj.replace(tzinfo=params.UTC), datetime.date(1982, 9, 2)]
+        self.assertEqual(params.coerce_from_datetimes(dts),
+                         [params.coerce_from_datetime(dt) for dt in dts])
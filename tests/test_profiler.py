@@ -0,0 +1,88 @@
+"""
+Tests for per-field serialization profiling
+"""
+
+import mock
+from google.appengine.ext import ndb
+from tests import BaseCase
+import profiler
+import resources
+
+RULES = [
+    resources.RestField('name'),
+    resources.DatetimeField('created_date'),
+    resources.RestField('body', required=True),
+]
+
+
+class Post(ndb.Model):
+    """
+    A datastore model to profile alongside dicts
+    """
+    name = ndb.StringProperty()
+
+
+class FieldProfilerTests(BaseCase):
+    """
+    Tests surrounding profiling resource fields
+    """
+
+    def tearDown(self):
+        profiler.disable()
+        super(FieldProfilerTests, self).tearDown()
+
+    def test_serialize(self):
+        objs = [{'name': 'Bob', 'created_date': None}, {'name': 'Sue', 'created_date': None}]
+
+        with profiler.profile() as field_profiler:
+            resources.Resource(objs[0], RULES).to_dict()
+            resources.ResourceList(objs, RULES).to_list()
+
+        calls = dict(((stat[0], stat[1], stat[2]), stat[3]) for stat in field_profiler.get_stats())
+        self.assertEqual(calls, {('NonDefinedClass', 'name', 'from_resource'): 3,
+                                 ('NonDefinedClass', 'created_date', 'from_resource'): 3,
+                                 ('NonDefinedClass', 'body', 'from_resource'): 3})
+
+        self.assertIsNone(profiler.active_profiler)
+        self.assertEqual(len(field_profiler.report(limit=2).splitlines()), 3)
+
+    def test_mixed_types(self):
+        objs = [{'name': 'Bob'}, Post(name='Sue', id='sue'), {'name': 'Joe'}]
+        rules = [resources.RestField('name')]
+
+        with profiler.profile() as field_profiler:
+            result = resources.ResourceList(objs, rules).to_list()
+        self.assertEqual([r['name'] for r in result], ['Bob', 'Sue', 'Joe'])
+
+        calls = dict(((stat[0], stat[1]), stat[3]) for stat in field_profiler.get_stats())
+        self.assertEqual(calls, {('NonDefinedClass', 'name'): 2, ('Post', 'name'): 1})
+
+    def test_validate(self):
+        field_profiler = profiler.enable()
+        resources.Resource(None, RULES).from_dict({'name': 'Bob', 'body': 'Text'})
+
+        self.assertEqual(sorted(stat[1] for stat in field_profiler.get_stats()), ['body', 'name'])
+        self.assertEqual(field_profiler.get_stats()[0][2], 'to_resource')
+
+        # Input is profiled under the given resource type
+        field_profiler.reset()
+        plan = resources.get_validation_plan(RULES)
+        plan.clean_many([{'body': 'Text'}], resource_type='Post')
+        self.assertEqual(field_profiler.get_stats()[0][:3], ('Post', 'body', 'to_resource'))
+
+    def test_disabled(self):
+        # Nothing is wrapped when profiling is disabled
+        with mock.patch.object(profiler.FieldProfiler, 'wrap_getters') as mock_wrap:
+            resources.ResourceList([{'name': 'Bob'}], RULES).to_list()
+        self.assertFalse(mock_wrap.called)
+
+    @mock.patch('profiler.time.time')
+    def test_record(self, mock_time):
+        field_profiler = profiler.FieldProfiler()
+
+        mock_time.side_effect = [1.0, 1.5]
+        getter = profiler.ProfiledGetter(field_profiler, 'Post', 'name', lambda objs, key: objs,
+                                         multi=True)
+        getter([{}, {}], 'name')
+
+        self.assertEqual(field_profiler.get_stats(), [('Post', 'name', 'from_resource', 2, 0.5)])
@@ -1,4 +1,7 @@
+import datetime
+import mock
 import voluptuous
+from google.appengine.ext import ndb
 from tests import BaseCase
 import resources
 
@@ -9,6 +12,16 @@ class TestObj(object):
     """
 
 
+class TestModel(ndb.Model):
+    """
+    A datastore model to test resource fetching against
+    """
+    name = ndb.StringProperty()
+    is_active = ndb.BooleanProperty()
+    body = ndb.TextProperty()
+    author_key = ndb.KeyProperty()
+
+
 class RestBaseCase(BaseCase):
     """
     Base Test Case for Resource
@@ -127,6 +140,78 @@ class ResourceTestCaseFromDict(RestBaseCase):
         self.assertRaises(resources.UnknownFieldError, r.from_dict, data)
 
 
+class ValidationPlanTests(RestBaseCase):
+    """
+    Tests surrounding the compiled rules validation plan
+    """
+
+    def test_errors(self):
+        self.assertRaises(TypeError, resources.ValidationPlan, 'not a list')
+
+        plan = resources.ValidationPlan([
+            resources.RestField('name', required=True),
+            resources.RestField('sku', output_only=True),
+            resources.RestField('size', validator=voluptuous.Coerce(int)),
+        ])
+
+        self.assertRaises(resources.UnknownFieldError, plan.clean, {'name': 'Bob', 'sku': '1'})
+        self.assertRaises(resources.RequiredFieldError, plan.clean, {'size': '1'})
+        self.assertRaises(resources.RestValueException, plan.clean, {'name': 'Bob', 'size': 'x'})
+
+        # Fields failing to convert a value raise RestValueException too
+        plan = resources.ValidationPlan([resources.DatetimeField('created'),
+                                         resources.GeoField('point')])
+        self.assertRaises(resources.RestValueException, plan.clean, {'created': 'yesterday'})
+        self.assertRaises(resources.RestValueException, plan.clean, {'point': {'lat': 1}})
+        self.assertRaises(resources.RestValueException, plan.clean,
+                          {'point': {'lat': 100, 'lon': 1}})
+        self.assertRaises(resources.RestValueException, plan.clean, {'created': 5})
+
+        # Other errors of a field are bugs rather than bad input
+        field = resources.RestField('name')
+        plan = resources.ValidationPlan([field])
+        with mock.patch.object(field, 'to_resource', side_effect=TypeError('Bug')):
+            self.assertRaises(TypeError, plan.clean, {'name': 'Bob'})
+
+    def test_clean(self):
+        plan = resources.ValidationPlan([
+            resources.RestField('name', required=True),
+            resources.RestField('size', validator=voluptuous.Coerce(int)),
+        ])
+
+        self.assertEqual(plan.clean({'name': 'Bob', 'size': '2'}), {'name': 'Bob', 'size': 2})
+        self.assertEqual(plan.allowed_keys, set(['name', 'size']))
+        self.assertEqual(plan.required_keys, set(['name']))
+
+    def test_clean_many(self):
+        plan = resources.ValidationPlan([
+            resources.RestField('name', required=True),
+            resources.RestField('size', validator=voluptuous.Coerce(int)),
+        ])
+
+        cleaned, errors = plan.clean_many([{'name': 'Bob', 'size': '2'},
+                                           {'size': '2'},
+                                           {'name': 'Sue', 'color': 'red'},
+                                           'Joe',
+                                           {'name': 'Ann', 'size': 'x'},
+                                           {'name': 'Kim'}])
+
+        self.assertEqual(cleaned, [{'name': 'Bob', 'size': 2}, {'name': 'Kim'}])
+        self.assertEqual([error['index'] for error in errors], [1, 2, 3, 4])
+        self.assertTrue('required' in errors[0]['message'])
+
+    @mock.patch('resources.voluptuous.Schema')
+    def test_schema_compiled_once(self, mock_schema):
+        fields = [resources.RestField('size', validator=voluptuous.Coerce(int))]
+
+        for i in range(3):
+            resources.Resource(None, fields).from_dict({'size': '2'})
+
+        self.assertEqual(mock_schema.call_count, 1)
+        self.assertTrue(resources.get_validation_plan(fields) is
+                        resources.get_validation_plan(fields))
+
+
 class ResourceTestCaseToDict(RestBaseCase):
     """
     Tests surrounding converting a resource to dict to output for json, etc
@@ -203,6 +288,387 @@ class ResourceTestCaseToDict(RestBaseCase):
                                                 'resource_type': 'NonDefinedClass'}})
 
 
+class ResourceSerializerTests(RestBaseCase):
+    """
+    Tests surrounding the compiled rules serializer
+    """
+
+    def test_errors(self):
+        self.assertRaises(TypeError, resources.ResourceSerializer, 'not a list')
+
+        serializer = resources.ResourceSerializer([resources.RestField('name')])
+        self.assertRaises(TypeError, serializer.to_dict, 'cheese')
+
+    def test_matches_resource(self):
+        # Test to ensure compiled output is identical to Resource.to_dict
+        fields = [
+            resources.RestField('name'),
+            resources.BooleanField('is_active'),
+            resources.RestField('size', verbose_only=True),
+        ]
+        serializer = resources.ResourceSerializer(fields)
+
+        obj = {'name': 'Bob', 'is_active': True, 'size': 'large'}
+        self.assertDictEqual(serializer.to_dict(obj),
+                             {'name': 'Bob', 'is_active': True,
+                              '_meta': {'is_verbose': False,
+                                        'resource_type': 'NonDefinedClass'}})
+        self.assertDictEqual(serializer.to_dict(obj, verbose=True),
+                             resources.Resource(obj, fields).to_dict(verbose=True))
+
+        # Entities are supported too
+        obj2 = TestModel(id='bob', name='Bob')
+        self.assertDictEqual(serializer.to_dict(obj2),
+                             {'name': 'Bob', 'is_active': False,
+                              '_meta': {'is_verbose': False, 'resource_type': 'TestModel'}})
+
+    def test_empty(self):
+        serializer = resources.ResourceSerializer([resources.RestField('name')])
+        self.assertDictEqual(serializer.to_dict(None), {})
+        self.assertDictEqual(serializer.to_dict({}), {})
+
+    def test_get_serializer_cached(self):
+        fields = [resources.RestField('name')]
+
+        serializer = resources.get_serializer(fields)
+        self.assertTrue(serializer is resources.get_serializer(fields))
+        self.assertFalse(serializer is resources.get_serializer(list(fields)))
+
+
+class SparseFieldsetTests(RestBaseCase):
+    """
+    Tests surrounding restricting output to requested fields
+    """
+
+    def test_fields(self):
+        fields = [
+            resources.RestField('name'),
+            resources.BooleanField('is_active'),
+            resources.RestField('size', verbose_only=True),
+        ]
+        serializer = resources.ResourceSerializer(fields)
+        obj = {'name': 'Bob', 'is_active': True, 'size': 'large'}
+
+        # Verbose only fields are output when requested and unknown fields are ignored
+        expected = {'size': 'large',
+                    '_meta': {'is_verbose': False, 'resource_type': 'NonDefinedClass',
+                              'omitted_fields': ['name', 'is_active']}}
+        self.assertDictEqual(serializer.to_dict(obj, fields=['size', 'cheese']), expected)
+        self.assertEqual(serializer.to_list([obj], fields=['size']), [expected])
+        self.assertDictEqual(resources.Resource(obj, fields).to_dict(fields=['size']), expected)
+
+        # Requesting every field is verbose
+        result = serializer.to_dict(obj, fields=['size', 'name', 'is_active'])
+        self.assertEqual(result['_meta']['is_verbose'], True)
+        self.assertEqual(result['_meta']['omitted_fields'], [])
+
+    def test_selection_cached(self):
+        serializer = resources.ResourceSerializer([resources.RestField('name')])
+
+        selection = serializer.get_selection(fields=['name'])
+        self.assertTrue(selection is serializer.get_selection(fields=['name', 'name']))
+        self.assertTrue(serializer.get_selection() is serializer.non_verbose_selection)
+        self.assertTrue(serializer.get_selection(True) is serializer.verbose_selection)
+
+    def test_resource_field(self):
+        author_fields = [resources.RestField('name'), resources.RestField('email')]
+        fields = [
+            resources.RestField('title'),
+            resources.ResourceField('author', 'author_id', author_fields),
+        ]
+        obj = {'title': 'Post 1', 'author_id': 'bob',
+               'author': {'name': 'Bob', 'email': 'bob@example.com'}}
+
+        expected_author = {'name': 'Bob',
+                           '_meta': {'is_verbose': False, 'resource_type': 'NonDefinedClass',
+                                     'omitted_fields': ['email']}}
+
+        result = resources.ResourceList([obj], fields).to_list(fields=['author.name'])
+        self.assertEqual(result[0]['author'], expected_author)
+        self.assertEqual(result[0]['_meta']['omitted_fields'], ['title'])
+
+        result = resources.Resource(obj, fields).to_dict(fields=['author.name'])
+        self.assertEqual(result['author'], expected_author)
+
+        # Requesting the whole field wins over its sub fields
+        result = resources.Resource(obj, fields).to_dict(fields=['author.name', 'author'])
+        self.assertEqual(result['author']['email'], 'bob@example.com')
+
+
+class NativeOutputTests(RestBaseCase):
+    """
+    Tests surrounding outputting raw datetimes and geo points for binary codecs
+    """
+
+    def test_native(self):
+        created = datetime.datetime(2016, 1, 2, 3, 4, 5)
+        points = [ndb.GeoPt(lat=1.5, lon=2.5)]
+        author_fields = [resources.RestField('name'), resources.DatetimeField('joined')]
+        fields = [
+            resources.DatetimeField('created'),
+            resources.GeoField('points'),
+            resources.ResourceField('author', 'author_id', author_fields),
+        ]
+        obj = {'created': created, 'points': points, 'author_id': 'bob',
+               'author': {'name': 'Bob', 'joined': created}}
+        serializer = resources.ResourceSerializer(fields)
+
+        # Nested resources are native too
+        for result in [serializer.to_dict(obj, native=True),
+                       serializer.to_list([obj], native=True)[0],
+                       serializer.to_dict(obj, fields=['created', 'author.joined'], native=True)]:
+            self.assertEqual(result['created'], created)
+            self.assertEqual(result['author']['joined'], created)
+        self.assertEqual(serializer.to_rows([obj], native=True).rows[0][1], points)
+
+        result = serializer.to_dict(obj)
+        self.assertEqual(result['created'], '2016-01-02T03:04:05Z')
+        self.assertEqual(result['author']['joined'], '2016-01-02T03:04:05Z')
+
+        selection = serializer.get_selection(native=True)
+        self.assertTrue(selection is serializer.get_selection(native=True))
+        self.assertFalse(selection is serializer.get_selection(True, native=True))
+
+
+class ProjectionTests(RestBaseCase):
+    """
+    Tests surrounding deriving ndb query projections from rules
+    """
+
+    def setUp(self):
+        super(ProjectionTests, self).setUp()
+
+        self.fields = [
+            resources.ResourceIdField(),
+            resources.RestField(TestModel.name),
+            resources.BooleanField('is_active'),
+            resources.RestField('body', verbose_only=True),
+            resources.ResourceField('author', 'author_key', [resources.RestField('name')]),
+        ]
+
+    def test_get_projection(self):
+        self.assertEqual(resources.get_projection(TestModel, self.fields),
+                         ['name', 'is_active', 'author_key'])
+        self.assertEqual(resources.get_projection(TestModel, self.fields, fields=['name']),
+                         ['name'])
+
+        # Unindexed and non datastore properties need full entities
+        self.assertIsNone(resources.get_projection(TestModel, self.fields, verbose=True))
+        self.assertIsNone(resources.get_projection(TestModel, [resources.RestField('cheese')]))
+        self.assertIsNone(resources.get_projection(TestModel, [resources.ResourceIdField()]))
+
+    def test_projected_entities(self):
+        bob_key = TestModel(id='bob', name='Bob', body='Big text').put()
+        TestModel(id='sue', name='Sue', body='Big text', is_active=True, author_key=bob_key).put()
+
+        projection = resources.get_projection(TestModel, self.fields, fields=['name', 'author'])
+        objs = TestModel.query().order(TestModel.name).fetch(projection=projection)
+
+        # Output with the selection the projection was built for
+        result = resources.ResourceList(objs, self.fields).to_list(fields=['name', 'author'])
+        self.assertEqual([r['name'] for r in result], ['Bob', 'Sue'])
+        self.assertEqual(result[1]['author']['name'], 'Bob')
+        self.assertEqual(result[1]['_meta']['omitted_fields'], ['resource_id', 'is_active', 'body'])
+
+        # Fields the projection left out are omitted rather than output as None or False
+        for result in [resources.ResourceList(objs, self.fields).to_list()[1],
+                       resources.Resource(objs[1], self.fields).to_dict(verbose=True)]:
+            self.assertEqual(result['name'], 'Sue')
+            self.assertNotIn('is_active', result)
+            self.assertNotIn('body', result)
+            self.assertEqual(result['_meta']['is_verbose'], False)
+
+        rows = resources.ResourceList(objs, self.fields).to_rows()
+        self.assertEqual(rows.columns, ['resource_id', 'name', 'author'])
+
+        # Projecting the field outputs its real value
+        projection = resources.get_projection(TestModel, self.fields)
+        objs = TestModel.query().order(TestModel.name).fetch(projection=projection)
+        result = resources.ResourceList(objs, self.fields).to_list()
+        self.assertEqual([r['is_active'] for r in result], [False, True])
+
+
+class ResourceListTests(RestBaseCase):
+    """
+    Tests surrounding serializing a collection of resources
+    """
+
+    def test_errors(self):
+        fields = [resources.RestField('name')]
+
+        self.assertRaises(TypeError, resources.ResourceList, ['cheese'], fields)
+        self.assertRaises(TypeError, resources.ResourceList, [], 'not a list')
+
+    def test_matches_resource(self):
+        # Test to ensure each item is identical to Resource.to_dict
+        fields = [
+            resources.RestField('name'),
+            resources.BooleanField('is_active'),
+            resources.DatetimeField('created_date'),
+            resources.RestField('size', verbose_only=True),
+        ]
+        objs = [{'name': 'Bob', 'is_active': True, 'size': 'large',
+                 'created_date': datetime.datetime(1982, 9, 2, 5, 30, 15)},
+                TestModel(id='sue', name='Sue'),
+                None]
+
+        for verbose in [True, False]:
+            expected = [resources.Resource(obj, fields).to_dict(verbose=verbose) for obj in objs]
+            result = resources.ResourceList(objs, fields).to_list(verbose=verbose)
+            self.assertEqual(result, expected)
+
+        self.assertEqual(result[0]['created_date'], '1982-09-02T05:30:15Z')
+        self.assertEqual(result[2], {})
+
+    def test_iterator(self):
+        fields = [resources.RestField('name')]
+        objs = ({'name': name} for name in ['Bob', 'Sue'])
+
+        result = resources.ResourceList(objs, fields).to_list()
+        self.assertEqual([r['name'] for r in result], ['Bob', 'Sue'])
+        self.assertEqual(resources.ResourceList(None, fields).to_list(), [])
+
+    def test_resource_field(self):
+        # Test to ensure referenced entities are serialized together
+        author_fields = [resources.RestField('name')]
+        fields = [
+            resources.RestField('title'),
+            resources.ResourceField('author', 'author_id', author_fields),
+        ]
+
+        post1 = TestObj()
+        post1.title = 'Post 1'
+        post1.author_id = 'bob'
+        post1.author = {'name': 'Bob'}
+        post2 = TestObj()
+        post2.title = 'Post 2'
+        post2.author_id = None
+
+        # TestObj is not a valid resource; serialize the field directly
+        field = fields[1]
+        self.assertEqual(field.from_resource_multi([post1, post2], 'author'),
+                         [{'name': 'Bob', '_meta': {'is_verbose': True,
+                                                    'resource_type': 'NonDefinedClass'}},
+                          None])
+
+    def test_resource_field_batched(self):
+        # Test to ensure referenced entities are fetched in a single deduped batch
+        bob_key = TestModel(id='bob', name='Bob').put()
+        sue_key = TestModel(id='sue', name='Sue').put()
+
+        author_fields = [resources.RestField('name')]
+        loader = mock.Mock(side_effect=resources.get_resources_async)
+        fields = [
+            resources.RestField('title'),
+            resources.ResourceField('author', 'author_key', author_fields, loader=loader),
+        ]
+
+        objs = [{'title': 'Post 1', 'author_key': bob_key},
+                {'title': 'Post 2', 'author_key': sue_key},
+                {'title': 'Post 3', 'author_key': bob_key},
+                {'title': 'Post 4', 'author_key': None},
+                {'title': 'Post 5', 'author_key': sue_key, 'author': {'name': 'Attached'}}]
+
+        result = resources.ResourceList(objs, fields).to_list()
+
+        loader.assert_called_once_with([bob_key, sue_key])
+        self.assertEqual([r['author'] and r['author']['name'] for r in result],
+                         ['Bob', 'Sue', 'Bob', None, 'Attached'])
+        self.assertEqual(result[0]['author']['_meta']['resource_type'], 'TestModel')
+
+    def test_resource_field_single(self):
+        # Test to ensure a single resource falls back to fetching its reference
+        bob_key = TestModel(id='bob', name='Bob').put()
+        fields = [
+            resources.ResourceField('author', 'author_key', [resources.RestField('name')]),
+        ]
+
+        result = resources.Resource({'author_key': bob_key.urlsafe()}, fields).to_dict()
+        self.assertEqual(result['author']['name'], 'Bob')
+
+        # Missing entities resolve to an empty resource
+        missing = ndb.Key('TestModel', 'missing')
+        result = resources.Resource({'author_key': missing}, fields).to_dict()
+        self.assertEqual(result['author'], {})
+
+    def test_to_rows(self):
+        fields = [
+            resources.RestField('name'),
+            resources.DatetimeField('created_date'),
+            resources.RestField('size', verbose_only=True),
+        ]
+        objs = [{'name': 'Bob', 'size': 'large',
+                 'created_date': datetime.datetime(1982, 9, 2, 5, 30, 15)},
+                None,
+                {'name': 'Sue'}]
+
+        result = resources.ResourceList(objs, fields).to_rows()
+        self.assertEqual(result.columns, ['name', 'created_date'])
+        self.assertEqual(result.rows, [('Bob', '1982-09-02T05:30:15Z'), None, ('Sue', None)])
+        self.assertEqual(result.meta, {'is_verbose': False, 'resource_type': 'NonDefinedClass'})
+
+        # Mixed resource types keep each row's _meta
+        mixed_objs = objs[:2] + [TestModel(id='sue', name='Sue')]
+        result = resources.ResourceList(mixed_objs, fields).to_rows()
+        self.assertEqual(result.columns, ['name', 'created_date', '_meta'])
+        self.assertIsNone(result.meta)
+        self.assertEqual([row[-1]['resource_type'] for row in result.rows if row],
+                         ['NonDefinedClass', 'TestModel'])
+
+        # Rows match to_list in column order
+        expected = resources.ResourceList(objs, fields).to_list(verbose=True, fields=['size'])
+        result = resources.ResourceList(objs, fields).to_rows(verbose=True, fields=['size'])
+        self.assertEqual(result.columns, ['size'])
+        self.assertEqual(result.rows, [(expected[0]['size'],), None, (expected[2]['size'],)])
+
+        result = resources.ResourceList([None], fields).to_rows()
+        self.assertEqual((result.rows, result.meta), ([None], {}))
+
+    def test_to_list_async(self):
+        # Test to ensure the tasklet yields on the batched fetch and matches to_list
+        bob_key = TestModel(id='bob', name='Bob').put()
+        loader = mock.Mock(side_effect=resources.get_resources_async)
+        fields = [
+            resources.RestField('title'),
+            resources.ResourceField('author', 'author_key', [resources.RestField('name')],
+                                    loader=loader),
+        ]
+        objs = [{'title': 'Post 1', 'author_key': bob_key}, None]
+        serializer = resources.get_serializer(fields)
+
+        future = serializer.to_list_async(objs)
+        self.assertTrue(isinstance(future, ndb.Future))
+        self.assertEqual(future.get_result(), serializer.to_list(objs))
+        self.assertEqual(loader.call_count, 2)  # Once for each serialization
+
+        result = serializer.to_list_async(objs, rows=True).get_result()
+        self.assertEqual(result.rows[0][1]['name'], 'Bob')
+
+        # The prefetch is reused for native output too
+        loader.reset_mock()
+        result = serializer.to_list_async(objs, native=True).get_result()
+        self.assertEqual(result, serializer.to_list(objs, native=True))
+        self.assertEqual(loader.call_count, 2)
+
+    def test_iter_resources(self):
+        fields = [resources.RestField('name')]
+        objs = [{'name': 'Bob'}, {'name': 'Sue'}, {'name': 'Joe'}]
+
+        result = resources.iter_resources(iter(objs), fields, batch_size=2)
+        self.assertFalse(isinstance(result, list))
+        self.assertEqual(list(result), resources.ResourceList(objs, fields).to_list())
+
+    def test_subclassed_from_resource(self):
+        # Test to ensure a subclass overriding only from_resource is still respected
+        class UpperField(resources.DatetimeField):
+            def from_resource(self, obj, field):
+                return obj.get(field).upper()
+
+        fields = [UpperField('name')]
+        result = resources.ResourceList([{'name': 'bob'}], fields).to_list()
+        self.assertEqual(result[0]['name'], 'BOB')
+
+
 class ResourceFieldInitTests(RestBaseCase):
     """
     Tests around the generic instantiation of general RestField
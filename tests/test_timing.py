@@ -0,0 +1,81 @@
+"""
+Tests for per-phase request timing
+"""
+
+import mock
+import webapp2
+from tests import BaseCase
+from tests.test_handlers import app
+import timing
+
+
+class RequestTimerTests(BaseCase):
+    """
+    Tests surrounding timing the phases of a request
+    """
+
+    @mock.patch('timing.time.time')
+    def test_base(self, mock_time):
+        timer = timing.RequestTimer()
+
+        mock_time.side_effect = [1.0, 1.002]
+        with timer.phase('decode'):
+            pass
+
+        timer.add('decode', 0.001)
+        timer.add_middleware('process_request', [('middleware.AuthMiddleware', 0.0005)])
+
+        self.assertEqual(timer.get_header(),
+                         'decode;dur=3.00, AuthMiddleware.process_request;dur=0.50')
+
+    def test_disabled(self):
+        self.assertTrue(timing.get_timer() is timing.NULL_TIMER)
+
+        with timing.NULL_TIMER.phase('decode'):
+            timing.NULL_TIMER.add('params', 1)
+        self.assertEqual(timing.NULL_TIMER.timings, {})
+
+
+class MemoryStatsSinkTests(BaseCase):
+    """
+    Tests surrounding keeping cumulative timings in process
+    """
+
+    def test_base(self):
+        sink = timing.MemoryStatsSink()
+        sink.record('ThingsHandler', 'GET', 200, [('params', 0.001), ('handler', 0.01)])
+        sink.record('ThingsHandler', 'GET', 200, [('params', 0.002)])
+
+        self.assertEqual(sink.get_stats(), [('ThingsHandler', 'GET', 'handler', 1, 0.01),
+                                            ('ThingsHandler', 'GET', 'params', 2, 0.003)])
+
+
+class HandlerTimingTests(BaseCase):
+    """
+    Tests surrounding reporting the timings of dispatched requests
+    """
+
+    def get_response(self, path):
+        return webapp2.Request.blank(path).get_response(app)
+
+    @mock.patch('handlers.API_SERVER_TIMING_ENABLED', True)
+    @mock.patch('timing.API_SERVER_TIMING_ENABLED', True)
+    def test_server_timing(self):
+        response = self.get_response('/things')
+
+        phases = [entry.split(';')[0] for entry in response.headers['Server-Timing'].split(', ')]
+        self.assertEqual(phases, ['params', 'serialize', 'encode', 'handler', 'total'])
+        self.assertEqual(response.headers['Timing-Allow-Origin'], 'http://example.com')
+
+    def test_stats_sink(self):
+        sink = timing.MemoryStatsSink()
+
+        with mock.patch('timing._stats_sink', sink):
+            response = self.get_response('/things')
+
+        self.assertFalse('Server-Timing' in response.headers)
+        self.assertEqual(sorted(stat[2] for stat in sink.get_stats()),
+                         ['encode', 'handler', 'params', 'serialize', 'total'])
+
+    def test_disabled(self):
+        self.assertFalse('Server-Timing' in self.get_response('/things').headers)
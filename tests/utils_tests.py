@@ -2,6 +2,7 @@
 Test for REST helpers
 """
 import mock
+import zlib
 from tests import BaseCase
 import utils
 
@@ -30,6 +31,83 @@ class WhiteListTests(BaseCase):
         self.assertFalse(utils.is_origin_in_whitelist('https://version-dcotx-project.appspot.com'))
 
 
+class OriginMatcherTests(BaseCase):
+    """
+    Tests Surrounding the compiled origin whitelist
+    """
+
+    def test_match(self):
+        matcher = utils.OriginMatcher(['http://www.example.com'],
+                                      [r'http://.*\.example\.appspot\.com', r'http://localhost:.*'])
+
+        self.assertFalse(matcher.match(None))
+        self.assertTrue(matcher.match('http://www.example.com'))
+        self.assertTrue(matcher.match('http://localhost:9090'))
+        self.assertFalse(matcher.match('http://evil.com/http://localhost:9090'))
+
+        # Decisions are cached
+        self.assertEqual(matcher.cache.get('http://localhost:9090'), True)
+        self.assertEqual(matcher.cache.get('http://evil.com/http://localhost:9090'), False)
+        self.assertEqual(matcher.cache.get('http://www.example.com'), None)
+
+    def test_no_rules(self):
+        matcher = utils.OriginMatcher([], [])
+        self.assertFalse(matcher.match('http://www.example.com'))
+
+
+class LRUCacheTests(BaseCase):
+    """
+    Tests Surrounding the bounded LRU cache
+    """
+
+    def test_eviction(self):
+        cache = utils.LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # b is now least recently used
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+        cache.delete('a')
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class CompressionTests(BaseCase):
+    """
+    Tests Surrounding response compression helpers
+    """
+
+    def test_choose_content_encoding(self):
+        self.assertEqual(utils.choose_content_encoding(None), None)
+        self.assertEqual(utils.choose_content_encoding('identity'), None)
+        self.assertEqual(utils.choose_content_encoding('gzip, deflate, br'), 'gzip')
+        self.assertEqual(utils.choose_content_encoding('deflate'), 'deflate')
+        self.assertEqual(utils.choose_content_encoding('gzip;q=0, deflate;q=0.5'), 'deflate')
+        self.assertEqual(utils.choose_content_encoding('*'), 'gzip')
+        self.assertEqual(utils.choose_content_encoding('*, gzip;q=0'), 'deflate')
+        self.assertEqual(utils.choose_content_encoding('gzip;q=bad'), None)
+
+    def test_compress(self):
+        output = '{"results": []}' * 100
+
+        gzipped = utils.compress(output, 'gzip')
+        self.assertEqual(zlib.decompress(gzipped, 16 + zlib.MAX_WBITS), output)
+        self.assertEqual(zlib.decompress(utils.compress(output, 'deflate')), output)
+
+    def test_compress_iter(self):
+        chunks = ['{"results": [', u'"a", ' * 100, '"b"]}']
+
+        gzipped = ''.join(utils.compress_iter(iter(chunks), 'gzip', level=1))
+        self.assertEqual(zlib.decompress(gzipped, 16 + zlib.MAX_WBITS), ''.join(chunks))
+
+
 class CreateRequestKeyTests(BaseCase):
     """
     Tests around the py side of creating request keys
@@ -98,3 +176,48 @@ class ApplyMiddlewareTests(BaseCase):
         # Check mocks
         self.assertEqual(mock_import.call_count, 2)
         self.assertEqual(class1.some_func.call_count, 2)
+
+
+@mock.patch('utils.path_to_reference')
+class MiddlewarePipelineTests(BaseCase):
+    """
+    Tests Around the prebuilt Middleware Pipeline
+    """
+
+    def test_resolved_once(self, mock_import):
+        class1 = mock.Mock(spec=['process_request'])
+        mock_import.return_value = class1
+        mock_request = mock.Mock()
+
+        pipeline = utils.MiddlewarePipeline(['someClass'])
+        pipeline.run('process_request', mock_request)
+        pipeline.run('process_request', mock_request)
+        timings = pipeline.run('process_response', mock_request)
+
+        mock_import.assert_called_once_with('someClass')
+        self.assertEqual(class1.process_request.call_count, 2)
+        self.assertEqual(timings, [])  # class1 has no process_response
+
+    def test_stats(self, mock_import):
+        mock_import.return_value = mock.Mock(spec=['process_request'])
+
+        pipeline = utils.MiddlewarePipeline(['someClass', 'otherClass'])
+        timings = pipeline.run('process_request', None)
+        pipeline.run('process_request', None)
+
+        self.assertEqual([path for path, seconds in timings], ['someClass', 'otherClass'])
+
+        stats = pipeline.get_stats()
+        self.assertEqual(sorted([(s[0], s[1], s[2]) for s in stats]),
+                         [('otherClass', 'process_request', 2),
+                          ('someClass', 'process_request', 2)])
+
+    def test_get_middleware_pipeline(self, mock_import):
+        with mock.patch('utils.settings.REST_MIDDLEWARE_CLASSES', ['someClass']):
+            pipeline = utils.get_middleware_pipeline()
+            self.assertTrue(pipeline is utils.get_middleware_pipeline())
+            self.assertEqual(mock_import.call_count, 1)
+
+        # Rebuilt if the configured classes change
+        with mock.patch('utils.settings.REST_MIDDLEWARE_CLASSES', []):
+            self.assertEqual(utils.get_middleware_pipeline().middleware_paths, ())